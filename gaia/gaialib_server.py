@@ -6,6 +6,12 @@ import signal
 import sqlite3
 import traceback as tb
 
+### skybox.py is in the parent directory, i.e. the top of this repository
+try: import skybox
+except ImportError:
+  sys.path.insert(1,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+  import skybox
+
 do_debug = 'DEBUG' in os.environ
 do_extra_debug = 'EXTRA_DEBUG' in os.environ
 do_data_debug = 'DATA_DEBUG' in os.environ
@@ -247,11 +253,23 @@ ORDER BY gaialight.phot_g_mean_mag ASC
       sys.stderr.flush()
     cu.execute(attach_query)
 
-  ### Make the query
-  cu.execute(query,dict(himag=himag,ralo=ralo,rahi=rahi,declo=declo,dechi=dechi))
+  ### Make the query, once per box from skybox.radecBoxes; a box that
+  ### crosses RA=0/360 (ralo>rahi, or ralo<0) becomes two boxes
+  boxes = skybox.radecBoxes(ralo,rahi,declo,dechi)
+  if 1 == len(boxes):
+    ralo,rahi,declo,dechi = boxes[0]
+    cu.execute(query,dict(himag=himag,ralo=ralo,rahi=rahi,declo=declo,dechi=dechi))
+    rows = cu
+  else:
+    ### Merge rows from all boxes in magnitude order, without duplicates
+    rowsByIdoffset = dict()
+    for ralo,rahi,declo,dechi in boxes:
+      cu.execute(query,dict(himag=himag,ralo=ralo,rahi=rahi,declo=declo,dechi=dechi))
+      for row in cu: rowsByIdoffset[row[0]] = row
+    rows = sorted(rowsByIdoffset.values(),key=lambda row:row[3])
 
   ### Iterate over the returned rows
-  for row in cu:
+  for row in rows:
 
     lrow = list(row)
     if do_data_debug and do_extra_debug:
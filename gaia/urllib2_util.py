@@ -14,19 +14,41 @@ class URLLIB2_WRAPPER(object):
   def __init__(self,hostname,maxsize=1,timeout=10):
     self.hostname,self.maxsize,self.timeout = hostname,maxsize,timeout
 
-  def request(self,sreq,path):
+  def request(self,sreq,path,headers=None,preload_content=True):
     url = 'http://{0}{1}'.format(self.hostname,path)
     if 'HEAD'==sreq:
       response = urllib2.urlopen(HEAD_REQUEST(url),timeout=self.timeout)
     else:
       assert 'GET'==sreq
-      response = urllib2.urlopen(urllib2.Request(url),timeout=self.timeout)
+      try:
+        response = urllib2.urlopen(urllib2.Request(url,headers=headers or {}),timeout=self.timeout)
+      except urllib2.HTTPError as e:
+        ### As urllib3:  a conditional GET of an unchanged file returns
+        ### status 304, with no data, instead of raising an exception
+        if 304 != e.code: raise
+        response = e
+      self.status = response.getcode()
+      if not preload_content:
+        ### As urllib3:  leave response open for .read; .release_conn
+        ### closes it
+        self.response = response
+        self.headers = dict(map(hdr2pair,response.headers))
+        return self
       self.data = response.read()
 
+    self.status = response.getcode()
     self.headers = dict(map(hdr2pair,response.headers))
 
     response.close()
 
     return self
 
+  def read(self,amt=None):
+    if amt is None: return self.response.read()
+    return self.response.read(amt)
+
+  def release_conn(self):
+    self.response.close()
+    del self.response
+
   def close(self,sreq,path): pass
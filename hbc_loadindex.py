@@ -239,12 +239,13 @@ if __name__ == "__main__":
         i += 1
 
     import math
+    import skybox
     dpr = 180.0 / math.pi
     print("TableName  Offset      X      Y      Z   Magn.")
     cn = sl3.connect(dikt['sqlite3db'])
     cu = cn.cursor()
 
-    cu.execute("""
+    sql = """
 SELECT %(prefix)sdata.offset
       ,%(prefix)sdata.x ,%(prefix)sdata.y ,%(prefix)sdata.z
       ,%(prefix)srtree.lomag
@@ -258,12 +259,20 @@ WHERE %(prefix)srtree.offset=%(prefix)sdata.offset
   AND %(prefix)srtree.hidec>?
   AND %(prefix)srtree.lodec<?
 ORDER BY %(prefix)srtree.lomag asc;
-  """ % dikt, arg5)
+  """ % dikt
+
+    ### Split box that crosses RA=0/360 (e.g. --lora=350 --hira=10)
+    boxes = skybox.radecBoxes(*arg5[1:])
+    fetched = list()
+    for box in boxes:
+      cu.execute(sql, arg5[:1]+list(box))
+      fetched.extend(cu.fetchall())
+    if len(boxes) > 1: fetched.sort(key=lambda row:row[4])
 
     def recra(row,isTestplot):
       if isTestplot: return (' %7.3f %7.3f' % (dpr*math.atan2(row[2],row[1]), dpr*math.asin(row[3]),),)
       return ('',)
-    rows = [ (dikt['prefix'],) + row + recra(row,dikt['testplot']) for row in cu.fetchall()]
+    rows = [ (dikt['prefix'],) + row + recra(row,dikt['testplot']) for row in fetched]
     for row in rows: print( "%9s %7d %6.3f %6.3f %6.3f %7.3f%s" % row )
 
     if len(rows) and dikt['testplot']:
@@ -5,6 +5,15 @@ httpgunzip.py - Get large GZIPped files from FTP server, including those
 
 Usage:  python httpgunzip.py index.dat suppl_1.dat tyc2.dat ReadMe
 
+Streaming, without writing decompressed files, e.g. for
+tyc2_loadindex.py --gzdir=...:
+
+  import httpgunzip
+  pieces = httpgunzip.listNNgz('tyc2.dat', '/mirror/cats/I/259')
+  for line in httpgunzip.gunzipLines(pieces): ...
+
+  - pieces may be in a local directory, or at an FTP/HTTP URL
+
 N.B. This script was created to download Tycho-2 star catalog and index
      files from Univ. Strasburg in France; the httpgunzip class can do
      other constructs; see the constructor documentation.
@@ -14,6 +23,9 @@ import re
 import os
 import sys
 import zlib
+import threading
+try: import Queue as queue
+except: import queue
 ### urllib2.urlopen is available in Python 3 as urllib.request.urlopen
 try: import urllib2
 except: import urllib.request as urllib2
@@ -34,6 +46,124 @@ def checkNNgz(fnIn, line):
   return None
 
 
+########################################################################
+def listNNgz(fnUrlFn, urlPfx):
+  """
+  Return sorted list of paths or URLs of all fnUrlFn.gz or fnUrlFn.NN.gz
+  pieces in urlPfx, a local directory or a URL of a directory listing
+
+  """
+  if os.path.isdir(urlPfx):
+    lines = os.listdir(urlPfx)
+  else:
+    lines = urllib2.urlopen(urlPfx).read().split(b'\n')
+    try: lines = [line.decode('8859') for line in lines]
+    except: pass
+  sfxs = set([checkNNgz(fnUrlFn, line.strip('\r')) for line in lines])
+  sfxs.discard(None)
+  return [os.path.join(urlPfx,fnUrlFn+sfx) for sfx in sorted(sfxs)]
+
+
+########################################################################
+class gunzipLines:
+  """
+  File-like object that reads lines, as strings, from the decompressed
+  concatenation of .gz pieces, without writing the decompressed data
+
+    [Local or URL GET] | [Decompression] | [Lines]
+
+  Constructor:  gunzipLines(pieces, chunkSize, prefetch)
+
+  Arguments:
+
+    pieces:  list of paths and/or URLs of .gz files, in order; see
+             listNNgz
+
+    chunkSize:  bytes of compressed data read at a time
+
+    prefetch:  number of decompressed chunks to read ahead in a
+               separate thread, so reading and decompression overlap
+               with the consumer's parsing; 0 to read in the
+               consumer's thread
+
+  Methods:  readline; close; iteration over lines
+
+  """
+  def __init__(self, pieces, chunkSize=1<<20, prefetch=4):
+    self.pieces = list(pieces)
+    self.chunkSize = chunkSize
+    self.lines, self.index, self.partial = [], 0, ''
+    self.thread, self.stopped = None, False
+    if prefetch > 0:
+      self.queue = queue.Queue(prefetch)
+      self.thread = threading.Thread(target=self.prefetch)
+      self.thread.daemon = True
+      self.thread.start()
+      self.chunkIter = iter(self.queue.get,None)
+    else:
+      self.chunkIter = self.chunks()
+
+  def chunks(self):
+    """Yield decompressed chunks of all pieces, in order"""
+    for piece in self.pieces:
+      if os.path.isfile(piece): fZin = open(piece,'rb')
+      else                    : fZin = urllib2.urlopen(piece)
+      dco = zlib.decompressobj(15+32)
+      while True:
+        dada = fZin.read( self.chunkSize )
+        if not dada: break
+        yield dco.decompress(dada)
+      yield dco.flush()
+      fZin.close()
+      fZin, dco = None,None
+
+  def prefetch(self):
+    """Thread target:  queue decompressed chunks, then None at the end;
+    an exception is queued to be raised in the consumer's thread"""
+    try:
+      for chunk in self.chunks():
+        if self.stopped: return
+        self.queue.put(chunk)
+    except Exception as e:
+      self.queue.put(e)
+    self.queue.put(None)
+
+  def readline(self):
+    """Return next line, with newline, or '' at the end"""
+    while self.index == len(self.lines):
+      chunk = next(self.chunkIter,None)
+      if chunk is None:
+        line, self.partial = self.partial, ''
+        return line
+      if isinstance(chunk,Exception): raise chunk
+      ### Split on newlines only; keep any partial last line for the
+      ### next chunk
+      self.lines = (self.partial + chunk.decode('8859')).split('\n')
+      self.partial = self.lines.pop()
+      self.index = 0
+    self.index += 1
+    return self.lines[self.index-1] + '\n'
+
+  def __iter__(self): return self
+  def next(self): return self.__next__()
+  def __next__(self):
+    line = self.readline()
+    if not line: raise StopIteration
+    return line
+
+  def close(self):
+    """Discard remaining data; stop prefetch thread"""
+    self.lines, self.index, self.partial = [], 0, ''
+    self.chunkIter = iter(())
+    if self.thread:
+      ### Unblock a pending .put, after which the thread sees stopped
+      self.stopped = True
+      try:
+        while True: self.queue.get_nowait()
+      except queue.Empty:
+        pass
+
+
 ########################################################################
 ### Default FTP URL is University of Strasburg, to get Tycho-2 data
 ### catalog and index files
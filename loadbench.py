@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+"""
+loadbench.py - time the catalog loaders against fixed-size synthetic
+               inputs, and write the results as JSON so runs can be
+               compared
+
+Loaders, and variants of each:
+
+  tyc2:  tyc2_loadindex.py reload; variants iter (default options),
+         numpy, jobs (--jobs=N), starrtree, magsort and unified
+  hbc:   hbc_loadindex.py reload
+  gaia:  gaia/gaia.py buildsqlitedb; variants pickle (.gaiapickle
+         files) and shard (.gaiashard files)
+
+Usage:
+
+  python loadbench.py [--stars=100000] \\
+                      [--jobs=4] \\
+                      [--workdir=loadbench.d] \\
+                      [--json=loadbench.json] \\
+                      [tyc2] [hbc] [gaia]
+
+  - With no loader arguments, all loaders are run
+  - Synthetic inputs, from synthcat.py, with about --stars stars for
+    each loader, are written to --workdir on the first run, and re-used
+    while --stars is unchanged; Gaia CSV files are converted to
+    .gaiapickle files with gaia.py's own CSV parser, gaia_read_csv, and
+    to .gaiashard files with gaia_read_csv_numpy, as getallgaia does
+
+Each loader variant is measured in two child processes, one after the
+other:
+
+  load:    the loader, run as a script exactly as from the command
+           line; wall time, rows/s, and peak RSS of that process
+
+  stages:  steps of the loader, run one at a time on the same inputs,
+           with the loader's own classes and functions:
+
+           parse      - input records to rows:  catalog lines to
+                        (offset,X,Y,Z,mag,pmRA,pmDE,tycid) via IterCat,
+                        NumpyCat or PoolCat (tyc2); HBC records to
+                        RA,DEC,mag (hbc); .gaiapickle files unpickled,
+                        or .gaiashard files read (gaia)
+           transform  - rows to TABLE rows:  uvsRow, pmRow, tycRow
+                        and starRtreeRow (tyc2); RA,DEC to unit vectors
+                        (hbc); MPITER row dicts, less the unpickling
+                        or reading time of parse (gaia)
+           index      - re-build, on the DB the load step wrote, of what
+                        the loader builds after the INSERTs:  magnitude
+                        INDEXes, and magsort or unified TABLEs (tyc2);
+                        none (hbc, gaia; their R-Trees are filled by
+                        the INSERTs)
+           insert     - the rest of the load time, i.e. load less
+                        parse, transform and index:  the INSERTs,
+                        transactions, and the small index.dat and
+                        paths TABLEs
+           csv        - not part of load, nor of insert:  Gaia CSV GZ
+                        files parsed, with gaia_read_csv (pickle) or
+                        gaia_read_csv_numpy (shard) (gaia only)
+
+Peak RSS is from os.wait4 for each child process, in KiB.
+
+Output JSON:  dict(when, host, python, stars, results), where results
+is a list, one dict per loader variant, of
+
+  loader, variant, rows,
+  load=dict(seconds, rowsPerSecond, peakRssKiB, status, log),
+  stages=dict(parse, transform, insert, index, and csv for gaia), in
+  seconds,
+  stagesPeakRssKiB,
+  and error, if either child failed
+
+"""
+import os
+import sys
+import gzip
+import json
+import math
+import time
+import platform
+import subprocess
+
+### This directory, for loader scripts and modules
+here = os.path.dirname(os.path.realpath(__file__))
+gaiaDir = os.path.join(here,'gaia')
+
+### Loader variants; extra command-line arguments to tyc2_loadindex.py
+tyc2Variants = [('iter',[],)
+               ,('numpy',['numpy'],)
+               ,('jobs',['--jobs=%(jobs)s'],)
+               ,('starrtree',['starrtree'],)
+               ,('magsort',['magsort'],)
+               ,('unified',['unified'],)
+               ]
+
+### Gaia loader variants; directory of data files for buildsqlitedb
+gaiaVariants = [('pickle','gaiapickles',)
+               ,('shard','gaiashards',)
+               ]
+
+### Seed for synthetic inputs, so runs with the same --stars compare
+seed = 2000
+
+
+########################################################################
+### Synthetic inputs, from synthcat.py
+
+def writeGaiaInputs(workdir, nStars):
+  """Write nStars rows of GaiaSource_N_M.csv.gz files to workdir/csv,
+then, as gaia.py getallgaia does from the files it downloads, parse
+each with gaia_read_csv and pickle it as a GAIACSV instance to
+workdir/gaiapickles, and parse each with gaia_read_csv_numpy and write
+it as a .gaiashard file to workdir/gaiashards; return number of rows
+pickled, i.e. those within the magnitude limit
+
+"""
+  import synthcat
+  if gaiaDir not in sys.path: sys.path.insert(0,gaiaDir)
+  import gaia
+  csvdir = os.path.join(workdir,'csv')
+  picklesdir,shardsdir = [os.path.join(workdir,d) for v,d in gaiaVariants]
+  for d in (csvdir,picklesdir,shardsdir,):
+    if not os.path.isdir(d): os.makedirs(d)
+  rows = 0
+  for hexmd5,csvgzpfx in synthcat.writeGaia(csvdir,nStars,seed=seed):
+    csvpath = os.path.join(csvdir,'%s.csv.gz' % (csvgzpfx,))
+    gcsv = gaia.GAIACSV(hexmd5,csvgzpfx,gaia.default_maglimit)
+    with gzip.open(csvpath,'rb') as fcsv:
+      (gcsv.rows,gcsv.column_names,gcsv.filtered_rows
+      ,) = gaia.gaia_read_csv(fcsv,scols=gaia.default_scols,maglimit=gcsv.maglimit)
+    gcsv.pickle(picklesdir)
+    rows += len(gcsv.rows)
+
+    gcsv = gaia.GAIACSV(hexmd5,csvgzpfx,gaia.default_maglimit)
+    with gzip.open(csvpath,'rb') as fcsv:
+      (gcsv.stars,gcsv.column_names,gcsv.filtered_rows
+      ,) = gaia.gaia_read_csv_numpy(fcsv,scols=gaia.default_scols,maglimit=gcsv.maglimit)
+    gaia.gaia_write_shard(os.path.join(shardsdir,'%s.gaiashard' % (csvgzpfx,)),gcsv)
+  return rows
+
+
+def writeInputs(workdir, loader, nStars):
+  """Write synthetic inputs for loader, unless those for nStars are
+already in workdir; return number of stars
+
+"""
+  stamp = os.path.join(workdir,'%s.inputs.json' % (loader,))
+  try:
+    with open(stamp) as f: dikt = json.load(f)
+    ### N.B. Gaia inputs written before the shard variant have no shards
+    if dikt['stars'] == nStars and (loader != 'gaia' or os.path.isdir(os.path.join(workdir,'gaiashards'))):
+      return dikt['rows']
+  except (IOError,OSError,ValueError,KeyError): pass
+  import synthcat
+  if loader == 'tyc2':
+    nSuppl1 = max(1,(nStars * synthcat.tyc2Suppl1Stars) // synthcat.tyc2CatalogStars)
+    rows = sum(synthcat.writeTyc2(workdir,nStars,nSuppl1,seed))
+  elif loader == 'hbc':
+    rows = synthcat.writeHbc(os.path.join(workdir,'BSC5'),nStars,seed)
+  else:
+    rows = writeGaiaInputs(workdir,nStars)
+  with open(stamp,'w') as f: json.dump(dict(stars=nStars,rows=rows),f)
+  return rows
+
+
+########################################################################
+### Commands for load step
+
+def loadCommand(workdir, loader, variant, jobs):
+  """Command line to run loader in workdir"""
+  w = lambda name: os.path.join(workdir,name)
+  if loader == 'tyc2':
+    extra = [s % dict(jobs=jobs) for s in dict(tyc2Variants)[variant]]
+    return [sys.executable,os.path.join(here,'tyc2_loadindex.py'),'reload'
+           ,'--sqlite3db=%s' % (w('tyc2.sqlite3'),)
+           ,'--index=%s' % (w('index.dat'),)
+           ,'--catalog=%s' % (w('catalog.dat'),)
+           ,'--suppl1=%s' % (w('suppl_1.dat'),)
+           ] + extra
+  if loader == 'hbc':
+    return [sys.executable,os.path.join(here,'hbc_loadindex.py'),'reload'
+           ,'--sqlite3db=%s' % (w('bsc5.sqlite3'),)
+           ,'--hbcatalog=%s' % (w('BSC5'),)
+           ]
+  return [sys.executable,os.path.join(gaiaDir,'gaia.py'),'buildsqlitedb','--nomd5sumtxt'
+         ,'--picklesdir=%s' % (w(dict(gaiaVariants)[variant]),)
+         ,'--sqlitedb=%s' % (w('gaia.sqlite3'),)
+         ]
+
+
+def runChild(argv, log):
+  """Run argv as child process, with STDERR to file log; return
+(seconds, peak RSS in KiB, exit status, STDOUT); exit status is as
+Popen.returncode, i.e. minus the signal number if killed by a signal
+
+"""
+  with open(log,'w') as flog:
+    t0 = time.time()
+    p = subprocess.Popen(argv,stdout=subprocess.PIPE,stderr=flog,cwd=here)
+    out = p.stdout.read()
+    pid,waitStatus,rusage = os.wait4(p.pid,0)
+    seconds = time.time() - t0
+  ### os.wait4 returns the raw wait status, e.g. 256 for exit code 1
+  if hasattr(os,'waitstatus_to_exitcode'): status = os.waitstatus_to_exitcode(waitStatus)
+  elif os.WIFSIGNALED(waitStatus)        : status = -os.WTERMSIG(waitStatus)
+  else                                   : status = os.WEXITSTATUS(waitStatus)
+  p.returncode = status
+  p.stdout.close()
+  ### ru_maxrss is in bytes on macOS, KiB elsewhere
+  peakRss = rusage.ru_maxrss
+  if sys.platform == 'darwin': peakRss //= 1024
+  return seconds,peakRss,status,out
+
+
+########################################################################
+### Stages, run in a child process via --stages=loader:variant
+
+def tyc2Stages(workdir, variant, jobs):
+  import sqlite3
+  import tyc2_loadindex as tl
+  times = dict()
+  useNumpy = variant == 'numpy'
+  if variant == 'jobs':
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+
+  t0 = time.time()
+  batches = list()
+  for nameplus in tl.namePluses:
+    ngtoks = nameplus.split(',')
+    path = os.path.join(workdir,dict(catalog='catalog.dat',suppl1='suppl_1.dat')[ngtoks[0]])
+    if variant == 'jobs': reciter = tl.PoolCat(pool,path,ngtoks,jobs,False)
+    elif useNumpy       : reciter = tl.NumpyCat(path,ngtoks)
+    else                : reciter = tl.IterCat(open(path,'r'),ngtoks)
+    batches.extend(reciter.batches())
+  times['parse'] = time.time() - t0
+  if variant == 'jobs':
+    pool.close()
+    pool.join()
+
+  t0 = time.time()
+  for batch in batches:
+    list(map(tl.uvsRow,batch))
+    list(map(tl.pmRow,batch))
+    list(map(tl.tycRow,batch))
+    if variant == 'starrtree': list(map(tl.starRtreeRow,batch))
+  times['transform'] = time.time() - t0
+
+  ### Drop, then re-build, what reload builds after the INSERTs
+  cn = sqlite3.connect(os.path.join(workdir,'tyc2.sqlite3'))
+  cu = cn.cursor()
+  for tableid in 'catalog suppl1'.split():
+    cu.execute("""DROP INDEX IF EXISTS %s_mag""" % (tableid,))
+    cu.execute("""DROP TABLE IF EXISTS tyc2%s_magsorted""" % (tableid,))
+    cu.execute("""DROP TABLE IF EXISTS tyc2%s_magbreaks""" % (tableid,))
+  for table in tl.unifiedTables: cu.execute("""DROP TABLE IF EXISTS %s""" % (table,))
+  cu.execute("""DELETE FROM tyc2pmmax WHERE tableid='all'""")
+  cn.commit()
+  t0 = time.time()
+  if variant == 'magsort':
+    cu.execute("""BEGIN TRANSACTION""")
+    for tableid in 'catalog suppl1'.split(): tl.createMagSorted(cu,tableid)
+    cn.commit()
+  if variant == 'unified':
+    cu.execute("""BEGIN TRANSACTION""")
+    tl.createUnified(cu)
+    cn.commit()
+  tl.createMagIndexes(cu)
+  cn.commit()
+  times['index'] = time.time() - t0
+  cn.close()
+  return times
+
+
+def hbcStages(workdir, variant, jobs):
+  from harvardbincat import HBC
+  times = dict()
+
+  ### Same reads as IterCat in hbc_loadindex.py
+  t0 = time.time()
+  f = open(os.path.join(workdir,'BSC5'),'rb')
+  hbc = HBC(fileArg=f)
+  rows = list()
+  for offset in range(hbc.absStarn):
+    hbc.getData(offset,fileArg=f)
+    rows.append((offset,hbc.sra0,hbc.sdec0,hbc.sra0Deg,hbc.sdec0Deg,hbc.mag[0],))
+  f.close()
+  times['parse'] = time.time() - t0
+
+  t0 = time.time()
+  xyzRows = list()
+  for offset,ra,dec,raDeg,decDeg,mag in rows:
+    cosra,sinra,cosdec,sindec = math.cos(ra),math.sin(ra),math.cos(dec),math.sin(dec)
+    xyzRows.append((offset,cosra*cosdec,sinra*cosdec,sindec,raDeg,decDeg,mag,))
+  times['transform'] = time.time() - t0
+  times['index'] = None
+  return times
+
+
+def gaiaStages(workdir, variant, jobs):
+  import glob
+  if gaiaDir not in sys.path: sys.path.insert(0,gaiaDir)
+  import gaia
+  times = dict()
+  picklesdir = os.path.join(workdir,dict(gaiaVariants)[variant])
+  ext = variant == 'shard' and 'gaiashard' or 'gaiapickle'
+
+  t0 = time.time()
+  for picklepath in glob.glob(os.path.join(picklesdir,'GaiaSource_*_*.%s' % (ext,))):
+    gaia.gaia_read_pickle(picklepath)
+  times['parse'] = time.time() - t0
+
+  ### MPITER unpickles, or reads shards, again; transform is the rest of
+  ### its time
+  t0 = time.time()
+  for row in gaia.MPITER(gaia_pickle_dir=picklesdir,no_md5sumtxt=True): pass
+  times['transform'] = time.time() - t0 - times['parse']
+  times['index'] = None
+
+  ### CSV GZ parsing, as getallgaia does for this variant
+  read_csv = variant == 'shard' and gaia.gaia_read_csv_numpy or gaia.gaia_read_csv
+  t0 = time.time()
+  for csvpath in glob.glob(os.path.join(workdir,'csv','GaiaSource_*_*.csv.gz')):
+    with gzip.open(csvpath,'rb') as fcsv: read_csv(fcsv,scols=gaia.default_scols)
+  times['csv'] = time.time() - t0
+  return times
+
+
+########################################################################
+def runOne(dikt, loader, variant):
+  """Run load and stages children for one loader variant; return dict
+for results list
+
+"""
+  workdir,jobs = dikt['workdir'],int(dikt['jobs'])
+  rtn = dict(loader=loader,variant=variant)
+
+  ### Inputs are written by a child process too, so this process stays
+  ### small:  a child's peak RSS starts at that of its parent
+  log = os.path.join(workdir,'%s.inputs.log' % (loader,))
+  argv = [sys.executable,os.path.realpath(__file__)
+         ,'--inputs=%s' % (loader,)
+         ,'--stars=%s' % (dikt['stars'],)
+         ,'--workdir=%s' % (workdir,)
+         ]
+  seconds,peakRss,status,out = runChild(argv,log)
+  if status:
+    rtn['error'] = 'inputs:  exit status %d; see %s' % (status,log,)
+    return rtn
+  rtn['rows'] = json.loads(out.decode())
+
+  log = os.path.join(workdir,'%s.%s.load.log' % (loader,variant,))
+  seconds,peakRss,status,out = runChild(loadCommand(workdir,loader,variant,jobs),log)
+  rtn['load'] = dict(seconds=seconds,rowsPerSecond=rtn['rows'] / seconds
+                    ,peakRssKiB=peakRss,status=status,log=log
+                    )
+  if status:
+    rtn['error'] = 'load:  exit status %d; see %s' % (status,log,)
+    return rtn
+
+  log = os.path.join(workdir,'%s.%s.stages.log' % (loader,variant,))
+  argv = [sys.executable,os.path.realpath(__file__)
+         ,'--stages=%s:%s' % (loader,variant,)
+         ,'--workdir=%s' % (workdir,)
+         ,'--jobs=%d' % (jobs,)
+         ]
+  seconds,peakRss,status,out = runChild(argv,log)
+  if status:
+    rtn['error'] = 'stages:  exit status %d; see %s' % (status,log,)
+    return rtn
+  stages = json.loads(out.decode())
+  stages['insert'] = rtn['load']['seconds'] - sum([v for k,v in stages.items() if v and k != 'csv'])
+  rtn['stages'] = stages
+  rtn['stagesPeakRssKiB'] = peakRss
+  return rtn
+
+
+########################################################################
+if __name__ == "__main__":
+
+  ######################################################################
+  ### Parse arguments
+
+  dikt = dict( tyc2=False
+             , hbc=False
+             , gaia=False
+             , stars='100000'
+             , jobs='4'
+             , workdir='loadbench.d'
+             , json='loadbench.json'
+             , stages=''
+             , inputs=''
+             )
+
+  for arg in sys.argv[1:]:
+
+    for key in dikt:
+
+      if arg == key and dikt[key] is False:
+        dikt[key] = True
+        break
+
+      dashkey = '--%s=' % key
+      L = len(dashkey)
+      if dashkey == arg[:L]:
+        dikt[key] = arg[L:]
+        break
+
+  dikt['workdir'] = os.path.realpath(dikt['workdir'])
+
+  ######################################################################
+  ### Child process:  write inputs for one loader, write JSON of row
+  ### count to STDOUT
+  if dikt['inputs']:
+    json.dump(writeInputs(dikt['workdir'],dikt['inputs'],int(dikt['stars'])),sys.stdout)
+    sys.exit(0)
+
+  ######################################################################
+  ### Child process:  run stages of one loader variant, write JSON of
+  ### stage times to STDOUT
+  if dikt['stages']:
+    loader,variant = dikt['stages'].split(':')
+    stages = dict(tyc2=tyc2Stages,hbc=hbcStages,gaia=gaiaStages)[loader]
+    json.dump(stages(dikt['workdir'],variant,int(dikt['jobs'])),sys.stdout)
+    sys.exit(0)
+
+  ######################################################################
+  ### Parent process:  run each loader variant, write JSON of results
+  if not os.path.isdir(dikt['workdir']): os.makedirs(dikt['workdir'])
+
+  loaders = [key for key in 'tyc2 hbc gaia'.split() if dikt[key]] or 'tyc2 hbc gaia'.split()
+  results = list()
+  fmt = '%-5s %-10s %9s %9s %11s %9s %9s %9s %9s %10s\n'
+  sys.stdout.write(fmt % ('','','rows','load,s','rows/s','parse,s','xform,s','insert,s','index,s','peakRSS,KiB',))
+
+  for loader in loaders:
+    variants = [v[0] for v in dict(tyc2=tyc2Variants,gaia=gaiaVariants).get(loader,[('default',)])]
+    for variant in variants:
+      rtn = runOne(dikt,loader,variant)
+      results.append(rtn)
+      if 'error' in rtn:
+        sys.stdout.write('%-5s %-10s ERROR:  %s\n' % (loader,variant,rtn['error'],))
+        continue
+      st = rtn['stages']
+      sec = lambda v: v is None and '-' or '%.3f' % (v,)
+      sys.stdout.write(fmt % (loader,variant,rtn['rows']
+                             ,sec(rtn['load']['seconds']),'%.0f' % (rtn['load']['rowsPerSecond'],)
+                             ,sec(st['parse']),sec(st['transform']),sec(st['insert']),sec(st['index'])
+                             ,rtn['load']['peakRssKiB']
+                             ))
+      sys.stdout.flush()
+
+  with open(dikt['json'],'w') as f:
+    json.dump(dict(when=time.strftime('%Y-%m-%dT%H:%M:%S')
+                  ,host=platform.node()
+                  ,python=platform.python_version()
+                  ,stars=int(dikt['stars'])
+                  ,results=results
+                  )
+             ,f,indent=1,sort_keys=True
+             )
+  sys.stderr.write('Wrote %s\n' % (dikt['json'],))
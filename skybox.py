@@ -0,0 +1,256 @@
+"""
+Decompose sky fields into RA,DEC boxes suitable for R-Tree queries
+
+The R-Tree queries in tyc2_loadindex.py, tyc2.py, hbc_loadindex.py and
+gaia/gaialib_server.py all take one lora<hira, lodec<hidec box.  This
+module converts fields that do not fit that shape into lists of boxes
+that do:
+
+- radecBoxes:  an RA,DEC box that crosses RA=0/360, e.g. lora=350 and
+               hira=10, or lora=-10 and hira=10, becomes two boxes
+
+- growBox:  an RA,DEC box grown by a margin, e.g. for proper motion,
+            becomes one or two boxes, or a polar cap box
+
+- coneBoxes:  a cone (circular field) becomes one tight box, or, near
+              |DEC|=90, a stack of DEC bands each with its own RA
+              width, plus a polar cap box over all RAs if the cone
+              contains a pole
+
+- polygonBoxes:  a convex spherical polygon, e.g. a rotated rectangular
+                 detector footprint given by its corner unit vectors,
+                 becomes its minimal RA,DEC box (two if it crosses
+                 RA=0/360), or a polar cap box if it contains a pole;
+                 polygonNormals gives the great-circle half-spaces for
+                 the exact cut
+
+All angles are in degrees.  Boxes are (lora,hira,lodec,hidec) tuples.
+
+R-Tree comparisons in those queries are strict (e.g. hira>lora), so RA
+limits at the 0/360 seam, as generated here, are raMin and raMax, which
+are just outside [0:360], so stars at exactly RA=0 are not lost.
+
+Usage:
+
+  import skybox
+
+  for lora,hira,lodec,hidec in skybox.radecBoxes(350.0, 10.0, -5.0, 5.0):
+    ...
+
+  for lora,hira,lodec,hidec in skybox.coneBoxes(skybox.radecToXyz(10.0, 85.0), 3.0):
+    ...
+
+  corners = [skybox.radecToXyz(ra, dec) for ra,dec in ((9,-1),(11,0),(10,2),(8,1))]
+  for lora,hira,lodec,hidec in skybox.polygonBoxes(corners):
+    ...
+
+"""
+import math
+
+### Radian per degree conversion factor
+rpd = math.pi / 180.0
+
+### RA limits of boxes at the RA=0/360 seam
+raMin,raMax = -1.0,361.0
+
+### Cones that reach beyond this |DEC| are split into DEC bands
+polarDec = 60.0
+polarBands = 8
+
+
+########################################################################
+def radecToXyz(ra, dec):
+  """Unit vector at RA,DEC"""
+  cosdec = math.cos(rpd*dec)
+  return (math.cos(rpd*ra)*cosdec, math.sin(rpd*ra)*cosdec, math.sin(rpd*dec),)
+
+
+########################################################################
+def xyzToRadec(xyz):
+  """RA,DEC of vector xyz; 0<=RA<360"""
+  x,y,z = xyz
+  r = math.sqrt(x*x + y*y + z*z)
+  return ((math.atan2(y,x) / rpd) % 360.0, math.asin(max(-1.0,min(1.0,z/r))) / rpd,)
+
+
+########################################################################
+def radecBoxes(lora, hira, lodec, hidec):
+  """Return list of boxes, each with lora<hira inside [raMin:raMax],
+that together cover RA,DEC box (lora,hira,lodec,hidec)
+
+- DEC limits are clipped to [-90:90]
+- A box 360 degrees or more wide in RA covers all RAs
+- RA limits outside [0:360] are wrapped; lora>hira after wrapping means
+  the box crosses RA=0/360 and is split into two boxes
+
+"""
+  lodec,hidec = max(lodec,-90.0),min(hidec,90.0)
+  if lodec >= hidec: return []
+  if hira - lora >= 360.0: return [(raMin,raMax,lodec,hidec,)]
+  if not (0.0 <= lora <= 360.0): lora %= 360.0
+  if not (0.0 <= hira <= 360.0): hira %= 360.0
+  if lora < hira: return [(lora,hira,lodec,hidec,)]
+  if lora == hira: return []
+  return [(lora,raMax,lodec,hidec,),(raMin,hira,lodec,hidec,)]
+
+
+########################################################################
+def raHalfWidth(dec0, radius, dec):
+  """Half-width in RA of cone, centered at DEC=dec0, along parallel at
+DEC=dec; 180 if that whole parallel is inside the cone, 0 if it does
+not meet the cone
+
+"""
+  den = math.cos(rpd*dec) * math.cos(rpd*dec0)
+  num = math.cos(rpd*radius) - math.sin(rpd*dec) * math.sin(rpd*dec0)
+  if den <= 0.0: return num <= 0.0 and 180.0 or 0.0
+  cosdra = num / den
+  if cosdra <= -1.0: return 180.0
+  if cosdra >= 1.0: return 0.0
+  return math.acos(cosdra) / rpd
+
+
+########################################################################
+def bandHalfWidth(dec0, radius, lodec, hidec):
+  """Maximum RA half-width of cone, centered at DEC=dec0, between
+parallels lodec and hidec:  at either parallel, or at the DEC where the
+cone is widest in RA if that is between them
+
+"""
+  widths = [raHalfWidth(dec0,radius,lodec),raHalfWidth(dec0,radius,hidec)]
+  sinWidest = math.sin(rpd*dec0) / math.cos(rpd*radius)
+  if abs(sinWidest) < 1.0:
+    widest = math.asin(sinWidest) / rpd
+    if lodec < widest < hidec: widths.append(raHalfWidth(dec0,radius,widest))
+  return max(widths)
+
+
+########################################################################
+def coneBoxes(xyz, radius, nBands=None):
+  """Return list of boxes that together bound the cone of radius
+around vector xyz
+
+- A cone that stays within |DEC|<polarDec is bound by one box (two if
+  it crosses RA=0/360), with RA half-width asin(sin(radius)/cos(DEC))
+- Otherwise the DEC range of the cone is split into nBands bands
+  (default polarBands), each bound by its own RA range; this avoids one
+  box over a wide RA range at high DEC.  Bands that cover all RAs, i.e.
+  around a pole inside the cone, are merged into one polar cap box
+
+"""
+  ra0,dec0 = xyzToRadec(xyz)
+  lodec,hidec = max(dec0 - radius,-90.0),min(dec0 + radius,90.0)
+  if radius >= 90.0: return [(raMin,raMax,lodec,hidec,)]
+
+  if nBands is None:
+    if hidec > polarDec or lodec < -polarDec: nBands = polarBands
+    else                                    : nBands = 1
+
+  boxes = list()
+  decs = [lodec + ((hidec - lodec) * i) / nBands for i in range(nBands+1)]
+  for lo,hi in zip(decs[:-1],decs[1:]):
+    dra = bandHalfWidth(dec0,radius,lo,hi)
+    if dra < 180.0:
+      boxes.extend(radecBoxes(ra0-dra,ra0+dra,lo,hi))
+    elif boxes and boxes[-1][:2] == (raMin,raMax,) and boxes[-1][3] == lo:
+      boxes[-1] = (raMin,raMax,boxes[-1][2],hi,)
+    else:
+      boxes.append((raMin,raMax,lo,hi,))
+  return boxes
+
+
+########################################################################
+def growBox(lora, hira, lodec, hidec, margin):
+  """Return list of boxes, as from radecBoxes, that together cover all
+points within margin of RA,DEC box (lora,hira,lodec,hidec), e.g. to
+include stars that may move into the box by proper motion
+
+- DEC limits move out by margin
+- RA limits move out by asin(sin(margin)/cos(DEC)) at the DEC limit
+  nearer a pole; a grown box that reaches a pole covers all RAs
+
+"""
+  if margin <= 0.0: return radecBoxes(lora,hira,lodec,hidec)
+  lodec,hidec = lodec - margin,hidec + margin
+  if lodec <= -90.0 or hidec >= 90.0: return radecBoxes(raMin,raMax,lodec,hidec)
+  cosdec = math.cos(rpd*max(abs(lodec),abs(hidec)))
+  dra = math.asin(min(1.0,math.sin(rpd*margin) / cosdec)) / rpd
+  if lora > hira and 0.0 <= lora <= 360.0 and 0.0 <= hira <= 360.0: hira += 360.0
+  return radecBoxes(lora-dra,hira+dra,lodec,hidec)
+
+
+########################################################################
+def cross(u, v):
+  """Cross product of 3-vectors u and v"""
+  return (u[1]*v[2]-u[2]*v[1], u[2]*v[0]-u[0]*v[2], u[0]*v[1]-u[1]*v[0],)
+
+def dot(u, v):
+  """Dot product of 3-vectors u and v"""
+  return u[0]*v[0] + u[1]*v[1] + u[2]*v[2]
+
+def unit(v):
+  """Unit vector along 3-vector v"""
+  r = math.sqrt(dot(v,v))
+  return (v[0]/r, v[1]/r, v[2]/r,)
+
+
+########################################################################
+def polygonNormals(corners):
+  """Return list of inward unit normals of the great-circle edges of a
+convex spherical polygon, with vertices corners, vectors in order
+around it in either direction; vector p is inside the polygon where
+dot(normal,p) >= 0 for every normal
+
+"""
+  n = len(corners)
+  assert n >= 3, 'Polygon needs at least 3 corners'
+  normals = [unit(cross(corners[i],corners[(i+1)%n])) for i in range(n)]
+  center = unit([sum([unit(corner)[k] for corner in corners]) for k in range(3)])
+  if sum([dot(normal,center) for normal in normals]) < 0.0:
+    normals = [(-x,-y,-z,) for x,y,z in normals]
+  return normals
+
+
+########################################################################
+def polygonBoxes(corners):
+  """Return list of boxes, as from radecBoxes, that together bound the
+convex spherical polygon with vertices corners (see polygonNormals)
+
+- DEC limits are the extremes of the vertices, and of each edge's great
+  circle where its highest or lowest point is on the edge
+- A polygon that contains a pole is bound by one polar cap box over all
+  RAs
+- Otherwise RA changes monotonically along each edge, in the direction
+  of the edge's normal, so the RA limits are the extremes of the
+  vertices' RAs, unwrapped by walking the edges
+
+"""
+  normals = polygonNormals(corners)
+  corners = [unit(corner) for corner in corners]
+  n = len(corners)
+
+  zs = [corner[2] for corner in corners]
+  for i in range(n):
+    a,b = corners[i],corners[(i+1)%n]
+    edge = cross(a,b)
+    ### Highest point of edge's great circle:  +Z less its normal component
+    nz = normals[i][2]
+    top = (-nz*normals[i][0],-nz*normals[i][1],1.0-nz*nz,)
+    if dot(top,top) <= 0.0: continue
+    top = unit(top)
+    for p in (top,(-top[0],-top[1],-top[2],),):
+      if dot(cross(a,p),edge) >= 0.0 and dot(cross(p,b),edge) >= 0.0: zs.append(p[2])
+  lodec,hidec = [math.asin(max(-1.0,min(1.0,z))) / rpd for z in (min(zs),max(zs),)]
+
+  ### Poles inside, or on an edge of, the polygon
+  if min([normal[2] for normal in normals]) >= 0.0: return [(raMin,raMax,lodec,90.0,)]
+  if max([normal[2] for normal in normals]) <= 0.0: return [(raMin,raMax,-90.0,hidec,)]
+
+  ras = [xyzToRadec(corner)[0] for corner in corners]
+  ra = lora = hira = ras[0]
+  for i in range(n):
+    dra = ras[(i+1)%n] - ras[i]
+    if cross(corners[i],corners[(i+1)%n])[2] > 0.0: ra += dra % 360.0
+    else                                         : ra -= (-dra) % 360.0
+    lora,hira = min(lora,ra),max(hira,ra)
+  return radecBoxes(lora,hira,lodec,hidec)
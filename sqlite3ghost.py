@@ -1,20 +1,82 @@
+"""
+sqlite3ghost.py - stand-in for the sqlite3 module, for machines where it
+                  is missing:  write SQL to STDOUT instead of to a DB, so
+                  the sqlite3 command-line shell can load it later
+
+Usage (as a fallback in tyc2_loadindex.py and hbc_loadindex.py):
+
+  python tyc2_loadindex.py reload > tyc2.sql
+  sqlite3 tyc2.sqlite3 < tyc2.sql
+
+- .executemany of an INSERT or REPLACE writes multi-row statements,
+  INSERT INTO t VALUES (...),(...),..., of up to rowsPerInsert rows each
+- .executemany outside a transaction is wrapped in one, so all rows are
+  loaded in large transactions
+- Parameters ? and ?NNN are replaced with SQL literals:  strings are
+  quoted with embedded quotes doubled, None is NULL, bytes are X'...',
+  floats keep full precision; NaN is NULL, as SQLite stores it, and
+  +/-inf are 9e999 and -9e999, which SQLite reads as +/-Inf
+- Nothing can be read back:  .fetchall returns an empty tuple
+
+"""
 import re
+import sys
+import math
+
+### Module attribute, so callers can tell this from the sqlite3 module
+isGhost = True
+
+### Rows per multi-row INSERT statement
+rowsPerInsert = 500
 
 def cvt1(arg):
-  if type(arg) is str: return "'%s'" % (arg,)
-  if arg is None: return ''
-  return str(arg)
+  """Convert one Python value to an SQL literal"""
+  if arg is None: return 'NULL'
+  if isinstance(arg,bool): return str(int(arg))
+  if isinstance(arg,(bytes,bytearray)) and not isinstance(arg,str):
+    return "X'%s'" % (''.join(['%02x' % (b,) for b in bytearray(arg)]),)
+  if isinstance(arg,float):
+    ### repr gives nan, inf, -inf, which SQLite would read as names
+    if math.isnan(arg): return 'NULL'
+    if math.isinf(arg): return arg > 0.0 and '9e999' or '-9e999'
+    return repr(arg)
+  if isinstance(arg,(int,)) or type(arg).__name__ == 'long': return str(arg)
+  return "'%s'" % (str(arg).replace("'","''"),)
 
 def cvt(args):
   return [cvt1(arg) for arg in args]
-  
+
+### Parameters:  ? or ?NNN
+reParam = re.compile('[?]([0-9]*)')
+
+### Statements that may be written as multi-row INSERTs
+reInsert = re.compile('^\\s*((?:INSERT|REPLACE)(?:\\s+OR\\s+\\w+)?\\s+INTO\\s+\\S+(?:\\s*\\([^)]*\\))?\\s+VALUES)\\s*(\\(.*\\))\\s*;?\\s*$'
+                     ,re.IGNORECASE|re.DOTALL
+                     )
+
+def bind(stmt, args):
+  """Replace parameters in stmt with SQL literals of args"""
+  literals = cvt(args)
+  nexts = iter(range(len(literals)))
+  def literal(match):
+    if match.group(1): return literals[int(match.group(1))-1]
+    return literals[next(nexts)]
+  return reParam.sub(literal,stmt)
+
+
 class sqlite3GhostClass:
-  def __init__(self,db):
+  def __init__(self,db,out=None):
     self.intransaction = False
-    print( "-- sqlite3GhostClass:  Open DB %s" % (db,) )
+    self.out = out or sys.stdout
+    self.write( "-- sqlite3GhostClass:  Open DB %s\n" % (db,) )
     return
 
-  def close(self): return
+  def write(self,text): self.out.write(text)
+
+  def close(self):
+    self.commit()
+    self.out.flush()
+    return
 
   def cursor(self): return self
 
@@ -23,24 +85,39 @@ class sqlite3GhostClass:
   def commit(self):
     if self.intransaction:
       self.intransaction = False
-      self.execute( "END TRANSACTION" )
+      self.write( "END TRANSACTION;\n" )
 
   def execute(self,stmt,args=()):
     if not args:
-      if re.match( "^BEGIN  *TRANSACTION$", stmt.upper().strip().strip(';')): self.intransaction = True
-      print("%s;"%(stmt,))
-      return
-    stmtList = stmt.split('?')
-    print( "%s;" % ( ''.join( [ i+j for i,j in zip( stmt.split('?'), cvt(tuple(args)+(None,)) ) ] ) ,) )
+      if re.match( "^BEGIN( +TRANSACTION)?$", stmt.upper().strip().strip(';').strip()): self.intransaction = True
+      self.write( "%s;\n" % (stmt.strip().rstrip(';'),) )
+      return self
+    self.write( "%s;\n" % (bind(stmt.strip().rstrip(';'),tuple(args)),) )
+    return self
 
   def executemany(self,stmt,argIter):
-    try:
-      while True:
-        arg = argIter.next()
-        self.execute(stmt, arg)
-    except:
-      pass
+    match = reInsert.match(stmt)
+    wrap = not self.intransaction
+    if wrap: self.execute( "BEGIN TRANSACTION" )
+
+    if not match:
+      for args in argIter: self.execute(stmt,args)
+    else:
+      ### Multi-row INSERT; plain ?,?,... templates are joined directly
+      head,template = match.groups()
+      plain = re.sub('\\s','',template[1:-1]).replace('?','') == ',' * template.count(',')
+      rows = []
+      for args in argIter:
+        if plain: rows.append( '(%s)' % (','.join(cvt(args)),) )
+        else    : rows.append( bind(template,tuple(args)) )
+        if len(rows) == rowsPerInsert:
+          self.write( "%s\n%s;\n" % (head,',\n'.join(rows),) )
+          rows = []
+      if rows: self.write( "%s\n%s;\n" % (head,',\n'.join(rows),) )
+
+    if wrap: self.commit()
+    return self
 
 
-def connect(db):
-  return sqlite3GhostClass(db)
+def connect(db,out=None):
+  return sqlite3GhostClass(db,out)
@@ -0,0 +1,710 @@
+#!/usr/bin/env python
+"""
+synthcat.py - write synthetic star catalogs, in the exact file formats
+              of the real ones, for performance and scaling tests on
+              machines without the real files
+
+Writes, into --outdir:
+
+  catalog.dat, suppl_1.dat, index.dat
+             - Tycho-2, 206- and 122-byte lines with |-separated fields
+               at the columns of catalog.hdr and suppl_1.hdr; index.dat
+               regions in GSC order (north DEC bands from the equator
+               up, then south), with TYC1 the region number, TYC2
+               running within the region, and RA,DEC ranges bounding
+               each region's stars
+
+  csv/GaiaSource_N_M.csv.gz, csv/MD5SUM.txt
+             - ESA Gaia DR2 gaia_source CSV files, all 94 DR2 columns
+               in DR2 order, rows in source_id order, N and M the
+               first and last source_id of each file; source_id is
+               the level 12 nested HEALPix pixel times 2**35 plus a
+               running number, as in DR2.  Astrometry, photometry and
+               l,b are filled in; most other columns are blank
+
+  BSC5       - Harvard Binary Catalog, as parsed by HBC.__init__ in
+               harvardbincat.py:  J2000 (starn<0), float star number,
+               one magnitude, proper motions; stars in RA order
+
+Star counts scale with --scale; 1.0 is the size of the real catalog:
+2539913 catalog.dat and 17588 suppl_1.dat stars, and 9110 BSC5 stars.
+Gaia rows default to the catalog.dat count.  Stars are denser toward
+the galactic plane and bulge, and magnitudes follow the counts and
+completeness limits of each catalog.  Output is the same for the same
+--seed and sizes.
+
+Usage:
+
+  python synthcat.py [--scale=1.0] \\
+                     [--outdir=.] \\
+                     [--seed=2000] \\
+                     [--gaiarows=N] [--gaiafilerows=27600] \\
+                     [--hbcstars=N] \\
+                     {tyc2|gaia|hbc|all} ...
+
+  - all writes all three of tyc2, gaia and hbc
+  - With none of them, or with an argument that is not recognised,
+    e.g. --help, this usage is written to STDERR, and nothing else
+  - e.g. 10x Tycho-2 for a scaling test, then load it:
+
+      python synthcat.py tyc2 --scale=10 --outdir=x10
+      python tyc2_loadindex.py reload --sqlite3db=x10/tyc2.sqlite3 \\
+        --index=x10/index.dat --catalog=x10/catalog.dat --suppl1=x10/suppl_1.dat
+
+"""
+import os
+import sys
+import gzip
+import math
+import shutil
+import struct
+import hashlib
+import numpy
+
+### Real catalog sizes, for --scale=1.0
+tyc2CatalogStars = 2539913
+tyc2Suppl1Stars = 17588
+bsc5Stars = 9110
+
+### Radian per degree conversion factor
+rpd = math.pi / 180.0
+
+
+########################################################################
+### Sky density
+
+def radecToXyz(ra, dec):
+  """Unit vector(s) at RA,DEC (degrees); scalars or NumPy arrays"""
+  cosdec = numpy.cos(rpd*dec)
+  return numpy.cos(rpd*ra)*cosdec,numpy.sin(rpd*ra)*cosdec,numpy.sin(rpd*dec)
+
+### J2000 equatorial to galactic rotation; rows are the galactic X
+### (toward the center), Y and Z (north pole) axes
+eqToGal = numpy.array([[-0.0548755604162154,-0.8734370902348850,-0.4838350155487132]
+                      ,[ 0.4941094278755837,-0.4448296299600112, 0.7469822444972189]
+                      ,[-0.8676661490190047,-0.1980763734312015, 0.4559837761750669]
+                      ])
+
+### Obliquity of the ecliptic, J2000
+obliquity = 23.4392911 * rpd
+
+### Maximum of skyDensity, for rejection sampling
+densityMax = 1.5
+
+
+def skyDensity(x, y, z):
+  """Relative density of stars at unit vector(s) x,y,z:  a floor, plus
+an exponential disk in galactic latitude, plus a bulge toward the
+galactic center; between 0.12 and densityMax
+
+"""
+  gx = eqToGal[0,0]*x + eqToGal[0,1]*y + eqToGal[0,2]*z
+  sinb = eqToGal[2,0]*x + eqToGal[2,1]*y + eqToGal[2,2]*z
+  bulge = numpy.clip(gx,0.0,1.0)**8
+  return 0.12 + 0.88*numpy.exp(-numpy.abs(sinb)/0.22) * (1.0 + 0.5*bulge)
+
+
+def skyPositions(rng, n):
+  """RA,DEC arrays (degrees) of n stars drawn from skyDensity"""
+  ras,decs,have = [],[],0
+  while have < n:
+    m = int((n - have) * 3.0) + 16
+    ra = rng.uniform(0.0,360.0,m)
+    dec = numpy.arcsin(rng.uniform(-1.0,1.0,m)) / rpd
+    keep = rng.uniform(0.0,densityMax,m) < skyDensity(*radecToXyz(ra,dec))
+    ras.append(ra[keep])
+    decs.append(dec[keep])
+    have += keep.sum()
+  return numpy.concatenate(ras)[:n],numpy.concatenate(decs)[:n]
+
+
+def magSampler(slope, complete, width, lo, hi):
+  """Return function(rng, n) that draws n magnitudes between lo and
+hi, with counts rising as 10**(slope*mag) and falling off around
+magnitude complete over a width of about width magnitudes
+
+"""
+  mags = numpy.linspace(lo,hi,2001)
+  pdf = 10.0**(slope*(mags-hi)) / (1.0 + numpy.exp((mags-complete)/width))
+  cdf = numpy.concatenate(([0.0],numpy.cumsum((pdf[1:]+pdf[:-1]) * 0.5)))
+  cdf /= cdf[-1]
+  return lambda rng, n: numpy.interp(rng.uniform(0.0,1.0,n),cdf,mags)
+
+### VT of catalog.dat (complete to about 11.5), VT of suppl_1.dat, V of
+### BSC5 (complete to 6.5), G of Gaia DR2 (complete to about 20.7)
+tyc2Mags = magSampler(0.42,11.5,0.35,-1.5,15.0)
+suppl1Mags = magSampler(0.30,9.0,0.8,-1.5,13.0)
+bsc5Mags = magSampler(0.55,6.5,0.15,-1.5,7.96)
+gaiaMags = magSampler(0.33,20.7,0.25,3.0,21.5)
+
+
+########################################################################
+### Tycho-2
+
+def gscRegions(nBands=43):
+  """Regions as (lora,hira,lodec,hidec) in GSC order:  nBands DEC
+bands from the equator north, then nBands from the equator south; each
+band split into RA ranges about as wide on the sky as the band is high.
+The default gives 9438 regions, near the 9537 of the real index.dat,
+so TYC1 fits its four columns
+
+"""
+  bandHeight = 90.0 / nBands
+  regions = list()
+  for sign in (1.0,-1.0):
+    for iBand in range(nBands):
+      lodec,hidec = sorted([sign*iBand*bandHeight,sign*(iBand+1)*bandHeight])
+      nRa = max(1,int(round(360.0 * math.cos(rpd*(lodec+hidec)*0.5) / bandHeight)))
+      for iRa in range(nRa):
+        regions.append(((360.0*iRa)/nRa,(360.0*(iRa+1))/nRa,lodec,hidec,))
+  return regions
+
+
+def regionCounts(rng, regions, n):
+  """Split n stars among regions, by skyDensity times area"""
+  lora,hira,lodec,hidec = [numpy.array(a) for a in zip(*regions)]
+  area = (hira-lora) * (numpy.sin(rpd*hidec)-numpy.sin(rpd*lodec))
+  weights = area * skyDensity(*radecToXyz((lora+hira)*0.5,(lodec+hidec)*0.5))
+  return rng.multinomial(n,weights / weights.sum())
+
+
+def fmtOrBlank(fmt, value, width):
+  """fmt % value, or width blanks if value is None"""
+  if value is None: return ' ' * width
+  return fmt % value
+
+
+def catalogLine(s):
+  """Line of catalog.dat, less newline, from dict s of one star's
+fields; the 31 separators are at the columns of catalog.hdr
+
+"""
+  b = fmtOrBlank
+  mean = s['pflag'] != 'X'
+  fields = ['%04d %05d %d' % (s['tyc1'],s['tyc2'],s['tyc3'],)
+           ,s['pflag']
+           ]
+  if mean:
+    fields += ['%12.8f' % s['ram'],'%12.8f' % s['decm']
+              ,'%7.1f' % s['pmra'],'%7.1f' % s['pmde']
+              ,'%3d' % s['eram'],'%3d' % s['edecm']
+              ,'%4.1f' % s['epmra'],'%4.1f' % s['epmde']
+              ,'%7.2f' % s['epram'],'%7.2f' % s['epdecm']
+              ,'%2d' % s['num']
+              ] + ['%3.1f' % q for q in s['q']]
+  else:
+    fields += [' '*w for w in (12,12,7,7,3,3,4,4,7,7,2,3,3,3,3,)]
+  fields += [b('%6.3f',s['bt'],6),b('%5.3f',s['ebt'],5)
+            ,b('%6.3f',s['vt'],6),b('%5.3f',s['evt'],5)
+            ,'%3d' % s['prox'],s['tyc']
+            ,s['hip'] and '%6d%-3s' % (s['hip'],s['ccdm'],) or ' '*9
+            ,'%12.8f' % s['ra'],'%12.8f' % s['dec']
+            ,'%4.2f' % s['epra90'],'%4.2f' % s['epdec90']
+            ,'%5.1f' % s['era'],'%5.1f' % s['edec']
+            ,s['posflg'],'%4.1f' % s['corr']
+            ]
+  return '|'.join(fields)
+
+
+def suppl1Line(s):
+  """Line of suppl_1.dat, less newline, from dict s of one star's
+fields; the 17 separators are at the columns of suppl_1.hdr
+
+"""
+  b = fmtOrBlank
+  return '|'.join(['%04d %05d %d' % (s['tyc1'],s['tyc2'],s['tyc3'],)
+                  ,s['flag']
+                  ,'%12.8f' % s['ra'],'%12.8f' % s['dec']
+                  ,'%7.1f' % s['pmra'],'%7.1f' % s['pmde']
+                  ,'%5.1f' % s['era'],'%5.1f' % s['edec']
+                  ,'%5.1f' % s['epmra'],'%5.1f' % s['epmde']
+                  ,s['mflag']
+                  ,b('%6.3f',s['bt'],6),b('%5.3f',s['ebt'],5)
+                  ,b('%6.3f',s['vt'],6),b('%5.3f',s['evt'],5)
+                  ,'%3d' % s['prox'],s['tyc']
+                  ,(s['hip'] and '%6d' % (s['hip'],) or ' '*6) + s['ccdm']
+                  ])
+
+
+def magError(mag, faint):
+  """Photometric error growing toward magnitude faint"""
+  return numpy.clip(0.005 + 0.2 * 10.0**(0.4*(mag-faint)),0.0,9.999)
+
+
+def tyc2Stars(rng, n, lora, hira, lodec, hidec, mags):
+  """Dict of arrays of fields common to catalog.dat and suppl_1.dat
+for n stars uniform in one region, with magnitudes from mags
+
+"""
+  s = dict(ra=rng.uniform(lora,hira,n)
+          ,dec=numpy.arcsin(rng.uniform(math.sin(rpd*lodec),math.sin(rpd*hidec),n)) / rpd
+          )
+  s['dec'] = numpy.clip(s['dec'],lodec,hidec)
+  ### Proper motions, mas/yr:  most small, a few high-velocity stars
+  pm = numpy.where(rng.uniform(0.0,1.0,n) < 0.01,300.0,15.0)
+  s['pmra'] = numpy.clip(rng.normal(0.0,1.0,n) * pm,-9999.0,9999.0)
+  s['pmde'] = numpy.clip(rng.normal(0.0,1.0,n) * pm,-9999.0,9999.0)
+  s['vt'] = mags(rng,n)
+  s['bt'] = s['vt'] + 0.85 * numpy.clip(rng.normal(0.7,0.35,n),-0.3,2.0)
+  return s
+
+
+def writeTyc2(outdir, nCatalog, nSuppl1, seed=2000):
+  """Write catalog.dat, suppl_1.dat and index.dat to outdir, with about
+nCatalog and nSuppl1 stars; return (catalog.dat, suppl_1.dat) counts
+
+"""
+  rng = numpy.random.default_rng(seed)
+  regions = gscRegions()
+  catCounts = regionCounts(rng,regions,nCatalog)
+  supCounts = regionCounts(rng,regions,nSuppl1)
+  fCat = open(os.path.join(outdir,'catalog.dat'),'w')
+  fSup = open(os.path.join(outdir,'suppl_1.dat'),'w')
+  fIdx = open(os.path.join(outdir,'index.dat'),'w')
+  catStart = supStart = 1
+  hip = 0
+
+  for region,(lora,hira,lodec,hidec) in enumerate(regions):
+    nCat,nSup = int(catCounts[region]),int(supCounts[region])
+    cat = tyc2Stars(rng,nCat,lora,hira,lodec,hidec,tyc2Mags)
+    sup = tyc2Stars(rng,nSup,lora,hira,lodec,hidec,suppl1Mags)
+
+    ### One TYC2 sequence for both files, so TYC identifiers are unique
+    tyc2s = numpy.cumsum(rng.integers(1,4,nCat+nSup))
+    isSup = numpy.zeros(nCat+nSup,dtype=bool)
+    isSup[rng.permutation(nCat+nSup)[:nSup]] = True
+    tyc3s = numpy.where(rng.uniform(0.0,1.0,nCat+nSup) < 0.005,2,1)
+
+    ### catalog.dat:  mean position at epoch EpRAm, EpDEm; observed
+    ### position at 1990+ER90, 1990+ED90, moved by proper motion
+    u = rng.uniform(0.0,1.0,(6,nCat))
+    epram,epdecm = 1990.0 + rng.normal(0.0,4.0,(2,nCat)).clip(-40.0,5.0)
+    epra90,epdec90 = rng.uniform(0.81,1.89,(2,nCat))
+    cosdec = numpy.maximum(numpy.cos(rpd*cat['dec']),1e-3)
+    ram = cat['ra'] - cat['pmra'] * (1990.0 + epra90 - epram) / (3.6e6 * cosdec)
+    decm = cat['dec'] - cat['pmde'] * (1990.0 + epdec90 - epdecm) / 3.6e6
+    hasBt,hasVt = u[0] > 0.02,u[1] > 0.02
+    hasBt |= ~hasVt
+    ebt,evt = magError(cat['bt'],13.0),magError(cat['vt'],12.5)
+    catStars = list()
+    for ra,dec,rm,dm,pmra,pmde,ept,epd,er90,ed90,bt,vt,e1,e2,hb,hv,u2,u3,u4,u5 in zip(*[a.tolist() for a in (cat['ra'],cat['dec'],ram % 360.0,decm.clip(-90.0,90.0)
+                                                                                                          ,cat['pmra'],cat['pmde'],epram,epdecm,epra90,epdec90
+                                                                                                          ,cat['bt'],cat['vt'],ebt,evt,hasBt,hasVt,u[2],u[3],u[4],u[5],)]):
+      isHip = u3 < 0.045
+      if isHip: hip += 1
+      catStars.append(dict(tyc1=region+1
+                                   ,pflag=u2 < 0.005 and 'X' or (u2 < 0.065 and 'P' or ' ')
+                                   ,ram=rm,decm=dm,pmra=pmra,pmde=pmde
+                                   ,eram=int(10+u4*90),edecm=int(10+u5*90)
+                                   ,epmra=1.0+u4*3.0,epmde=1.0+u5*3.0
+                                   ,epram=ept,epdecm=epd,num=int(2+u4*20)
+                                   ,q=(u4,u5,u2*9.9,u3*9.9)
+                                   ,bt=hb and bt or None,ebt=hb and e1 or None
+                                   ,vt=hv and vt or None,evt=hv and e2 or None
+                                   ,prox=u5 < 0.03 and int(30+u4*900) or 999
+                                   ,tyc=isHip and 'T' or ' '
+                                   ,hip=isHip and hip,ccdm=u5 < 0.1 and 'A' or ''
+                                   ,ra=ra % 360.0,dec=dec,epra90=er90-0.81,epdec90=ed90-0.81
+                                   ,era=10.0+u4*150.0,edec=10.0+u5*150.0
+                                   ,posflg=u4 < 0.01 and 'D' or (u5 < 0.005 and 'P' or ' ')
+                                   ,corr=u2*1.8-0.9
+                                   ))
+
+    ### suppl_1.dat:  Hipparcos (H) or Tycho-1 (T) positions, epoch
+    ### J1991.25; mflag B or V if only that magnitude is given, H if
+    ### VT is the Hipparcos magnitude
+    u = rng.uniform(0.0,1.0,(4,nSup))
+    ebt,evt = magError(sup['bt'],13.0),magError(sup['vt'],12.5)
+    supStars = list()
+    for ra,dec,pmra,pmde,bt,vt,e1,e2,u0,u1,u2,u3 in zip(*[a.tolist() for a in (sup['ra'],sup['dec'],sup['pmra'],sup['pmde']
+                                                                             ,sup['bt'],sup['vt'],ebt,evt,u[0],u[1],u[2],u[3],)]):
+      isHip = u0 < 0.8
+      if isHip: hip += 1
+      mflag = u1 < 0.85 and ' ' or ('BVH'[int((u1-0.85)/0.05)])
+      supStars.append(dict(tyc1=region+1,flag=isHip and 'H' or 'T'
+                          ,ra=ra,dec=dec,pmra=pmra,pmde=pmde
+                          ,era=1.0+u2*50.0,edec=1.0+u3*50.0,epmra=1.0+u2*20.0,epmde=1.0+u3*20.0
+                          ,mflag=mflag
+                          ,bt=mflag in ' B' and bt or None,ebt=mflag in ' B' and e1 or None
+                          ,vt=mflag in ' VH' and vt or None,evt=mflag in ' VH' and e2 or None
+                          ,prox=u2 < 0.3 and int(10+u3*900) or 999
+                          ,tyc=isHip and 'T' or ' ',hip=isHip and hip,ccdm=u3 < 0.2 and 'A' or ' '
+                          ))
+
+    ### Assign TYC2,TYC3 in order through both files
+    catIter,supIter = iter(catStars),iter(supStars)
+    catOut,supOut = list(),list()
+    for tyc2,tyc3,sup1 in zip(tyc2s.tolist(),tyc3s.tolist(),isSup.tolist()):
+      s = sup1 and next(supIter) or next(catIter)
+      s['tyc2'],s['tyc3'] = tyc2,tyc3
+      if sup1: supOut.append(suppl1Line(s))
+      else   : catOut.append(catalogLine(s))
+
+    ### index.dat:  RA,DEC range of the region's stars, rounded outward
+    if nCat + nSup:
+      ras = numpy.concatenate((cat['ra'] % 360.0,ram % 360.0,sup['ra'],))
+      decs = numpy.concatenate((cat['dec'],decm,sup['dec'],))
+      box = (math.floor(ras.min()*100.0)/100.0,math.ceil(ras.max()*100.0)/100.0
+            ,math.floor(decs.min()*100.0)/100.0,math.ceil(decs.max()*100.0)/100.0
+            ,)
+    else:
+      box = (lora,hira,lodec,hidec,)
+    fIdx.write('%7d|%6d|%6.2f|%6.2f|%6.2f|%6.2f\n' % ((catStart,supStart,)+box))
+    if catOut: fCat.write('%s\n' % ('\n'.join(catOut),))
+    if supOut: fSup.write('%s\n' % ('\n'.join(supOut),))
+    catStart += nCat
+    supStart += nSup
+
+  fIdx.write('%7d|%6d|%6.2f|%6.2f|%6.2f|%6.2f\n' % (catStart,supStart,0.0,0.0,0.0,0.0,))
+  for f in (fCat,fSup,fIdx,): f.close()
+  return catStart-1,supStart-1
+
+
+########################################################################
+### Gaia DR2
+
+### Columns of DR2 gaia_source CSV files, in order
+gaiaColumns = """
+solution_id designation source_id random_index ref_epoch
+ra ra_error dec dec_error parallax parallax_error parallax_over_error
+pmra pmra_error pmdec pmdec_error
+ra_dec_corr ra_parallax_corr ra_pmra_corr ra_pmdec_corr
+dec_parallax_corr dec_pmra_corr dec_pmdec_corr
+parallax_pmra_corr parallax_pmdec_corr pmra_pmdec_corr
+astrometric_n_obs_al astrometric_n_obs_ac astrometric_n_good_obs_al
+astrometric_n_bad_obs_al astrometric_gof_al astrometric_chi2_al
+astrometric_excess_noise astrometric_excess_noise_sig
+astrometric_params_solved astrometric_primary_flag astrometric_weight_al
+astrometric_pseudo_colour astrometric_pseudo_colour_error
+mean_varpi_factor_al astrometric_matched_observations
+visibility_periods_used astrometric_sigma5d_max
+frame_rotator_object_type matched_observations duplicated_source
+phot_g_n_obs phot_g_mean_flux phot_g_mean_flux_error
+phot_g_mean_flux_over_error phot_g_mean_mag
+phot_bp_n_obs phot_bp_mean_flux phot_bp_mean_flux_error
+phot_bp_mean_flux_over_error phot_bp_mean_mag
+phot_rp_n_obs phot_rp_mean_flux phot_rp_mean_flux_error
+phot_rp_mean_flux_over_error phot_rp_mean_mag
+phot_bp_rp_excess_factor phot_proc_mode bp_rp bp_g g_rp
+radial_velocity radial_velocity_error rv_nb_transits
+rv_template_teff rv_template_logg rv_template_fe_h phot_variable_flag
+l b ecl_lon ecl_lat priam_flags
+teff_val teff_percentile_lower teff_percentile_upper
+a_g_val a_g_percentile_lower a_g_percentile_upper
+e_bp_min_rp_val e_bp_min_rp_percentile_lower e_bp_min_rp_percentile_upper
+flame_flags radius_val radius_percentile_lower radius_percentile_upper
+lum_val lum_percentile_lower lum_percentile_upper
+""".split()
+
+### Photometric zero points of G, BP and RP, DR2
+gaiaZeroPoints = dict(g=25.6884,bp=25.3514,rp=24.7619)
+
+### Level 12 nested HEALPix, in source_id above bit 35; rows are
+### bucketed by level 2 pixel (source_id >> (35+2*10)) while writing
+healpixOrder = 12
+bucketShift = 35 + 2*(healpixOrder-2)
+
+
+def healpixNest(ra, dec, order=healpixOrder):
+  """Nested HEALPix pixel number(s) at RA,DEC (degrees) arrays"""
+  nside = 1 << order
+  z = numpy.sin(rpd*dec)
+  tt = (ra % 360.0) / 90.0
+  za = numpy.abs(z)
+
+  ### Equatorial zone, |z|<=2/3
+  temp1 = nside * (0.5 + tt)
+  temp2 = nside * z * 0.75
+  jp = (temp1 - temp2).astype(numpy.int64)
+  jm = (temp1 + temp2).astype(numpy.int64)
+  ifp,ifm = jp // nside,jm // nside
+  faceEq = numpy.where(ifp == ifm,ifp | 4,numpy.where(ifp < ifm,ifp,ifm + 8))
+  ixEq = jm & (nside-1)
+  iyEq = nside - (jp & (nside-1)) - 1
+
+  ### Polar caps
+  ntt = numpy.minimum(tt.astype(numpy.int64),3)
+  tp = tt - ntt
+  tmp = nside * numpy.sqrt(3.0 * (1.0 - za))
+  jpp = numpy.minimum((tp * tmp).astype(numpy.int64),nside-1)
+  jmp = numpy.minimum(((1.0 - tp) * tmp).astype(numpy.int64),nside-1)
+  north = z >= 0.0
+  facePo = numpy.where(north,ntt,ntt + 8)
+  ixPo = numpy.where(north,nside - jmp - 1,jpp)
+  iyPo = numpy.where(north,nside - jpp - 1,jmp)
+
+  eq = za <= 2.0/3.0
+  face = numpy.where(eq,faceEq,facePo)
+  ix = numpy.where(eq,ixEq,ixPo)
+  iy = numpy.where(eq,iyEq,iyPo)
+
+  ### Interleave bits of ix (even) and iy (odd)
+  ipix = numpy.zeros(ra.shape,dtype=numpy.int64)
+  for bit in range(order):
+    ipix |= ((ix >> bit) & 1) << (2*bit)
+    ipix |= ((iy >> bit) & 1) << (2*bit+1)
+  return face * nside * nside + ipix
+
+
+def csvStrings(values, present=None, fmt=repr):
+  """List of CSV field strings of array values; blank where present
+is False
+
+"""
+  values = values.tolist()
+  if present is None: return [fmt(v) for v in values]
+  return [p and fmt(v) or '' for v,p in zip(values,present.tolist())]
+
+
+def gaiaRows(rng, ra, dec, sourceIds):
+  """Lines, less newlines, of DR2 CSV rows for stars at RA,DEC arrays,
+in source_id order
+
+"""
+  n = len(ra)
+  cols = dict()
+  g = gaiaMags(rng,n)
+  color = numpy.clip(rng.normal(0.9,0.45,n),-0.4,4.0)
+  hasBpRp = rng.uniform(0.0,1.0,n) > 0.07
+  ### 2-parameter solutions (no parallax, proper motion) for faint stars
+  five = rng.uniform(0.0,1.0,n) > (0.02 + 0.9 / (1.0 + numpy.exp((19.5-g)/0.5)))
+  sigma = 0.02 + 0.6 * 10.0**(0.2*(g-20.0))
+  x,y,z = radecToXyz(ra,dec)
+
+  cols['solution_id'] = ['1635721458409799680'] * n
+  cols['designation'] = ['Gaia DR2 %d' % (s,) for s in sourceIds.tolist()]
+  cols['source_id'] = csvStrings(sourceIds)
+  cols['random_index'] = csvStrings(rng.integers(0,1692919135,n))
+  cols['ref_epoch'] = ['2015.5'] * n
+  cols['ra'],cols['dec'] = csvStrings(ra),csvStrings(dec)
+  cols['ra_error'] = csvStrings(sigma * rng.uniform(0.8,1.2,n))
+  cols['dec_error'] = csvStrings(sigma * rng.uniform(0.8,1.2,n))
+  parallax = numpy.abs(rng.lognormal(-0.5,0.8,n)) + rng.normal(0.0,1.0,n) * sigma
+  cols['parallax'] = csvStrings(parallax,five)
+  cols['parallax_error'] = csvStrings(sigma * 1.3,five)
+  cols['parallax_over_error'] = csvStrings(parallax / (sigma * 1.3),five)
+  for pm in ('pmra','pmdec',):
+    cols[pm] = csvStrings(rng.normal(0.0,6.0,n),five)
+    cols[pm+'_error'] = csvStrings(sigma * 2.0,five)
+  for corr in [c for c in gaiaColumns if c.endswith('_corr')]:
+    cols[corr] = csvStrings(rng.uniform(-0.5,0.5,n),corr == 'ra_dec_corr' and None or five)
+  nObs = rng.integers(60,500,n)
+  cols['astrometric_n_obs_al'] = csvStrings(nObs)
+  cols['astrometric_n_obs_ac'] = csvStrings(numpy.where(g < 13.0,nObs,0))
+  cols['astrometric_n_good_obs_al'] = csvStrings(nObs - nObs // 50)
+  cols['astrometric_n_bad_obs_al'] = csvStrings(nObs // 50)
+  cols['astrometric_gof_al'] = csvStrings(rng.normal(0.5,2.0,n))
+  cols['astrometric_chi2_al'] = csvStrings(nObs * rng.uniform(0.8,2.0,n))
+  cols['astrometric_excess_noise'] = csvStrings(numpy.abs(rng.normal(0.0,0.3,n)))
+  cols['astrometric_excess_noise_sig'] = csvStrings(numpy.abs(rng.normal(0.0,2.0,n)))
+  cols['astrometric_params_solved'] = ['%d' % (f and 31 or 3,) for f in five.tolist()]
+  cols['astrometric_primary_flag'] = ['false'] * n
+  cols['astrometric_weight_al'] = csvStrings(1.0 / (sigma * sigma))
+  cols['mean_varpi_factor_al'] = csvStrings(rng.uniform(-0.3,0.3,n))
+  cols['astrometric_matched_observations'] = csvStrings(nObs // 9)
+  cols['visibility_periods_used'] = csvStrings(rng.integers(6,20,n))
+  cols['astrometric_sigma5d_max'] = csvStrings(sigma * 2.5)
+  cols['frame_rotator_object_type'] = ['0'] * n
+  cols['matched_observations'] = cols['astrometric_matched_observations']
+  cols['duplicated_source'] = ['false'] * n
+
+  bp,rp = g + 0.45*color - 0.05,g - 0.55*color + 0.05
+  for band,mag,present in (('g',g,None,),('bp',bp,hasBpRp,),('rp',rp,hasBpRp,),):
+    flux = 10.0**(-0.4*(mag-gaiaZeroPoints[band]))
+    overError = numpy.clip(3000.0 * 10.0**(-0.2*(mag-15.0)),2.0,None)
+    pfx = 'phot_%s_' % (band,)
+    cols[pfx+'n_obs'] = csvStrings(nObs // 8 + 1,present)
+    cols[pfx+'mean_flux'] = csvStrings(flux,present)
+    cols[pfx+'mean_flux_error'] = csvStrings(flux / overError,present)
+    cols[pfx+'mean_flux_over_error'] = csvStrings(overError,present,fmt=lambda v: '%.4f' % (v,))
+    cols[pfx+'mean_mag'] = csvStrings(mag,present,fmt=lambda v: '%.6f' % (v,))
+  cols['phot_bp_rp_excess_factor'] = csvStrings(rng.uniform(1.15,1.4,n),hasBpRp)
+  cols['phot_proc_mode'] = ['0'] * n
+  cols['bp_rp'] = csvStrings(bp-rp,hasBpRp,fmt=lambda v: '%.6f' % (v,))
+  cols['bp_g'] = csvStrings(bp-g,hasBpRp,fmt=lambda v: '%.6f' % (v,))
+  cols['g_rp'] = csvStrings(g-rp,hasBpRp,fmt=lambda v: '%.6f' % (v,))
+  cols['phot_variable_flag'] = ['NOT_AVAILABLE'] * n
+
+  ### Galactic and ecliptic coordinates
+  gx,gy,gz = [eqToGal[i,0]*x + eqToGal[i,1]*y + eqToGal[i,2]*z for i in range(3)]
+  cols['l'] = csvStrings((numpy.arctan2(gy,gx) / rpd) % 360.0)
+  cols['b'] = csvStrings(numpy.arcsin(numpy.clip(gz,-1.0,1.0)) / rpd)
+  ey = math.cos(obliquity)*y + math.sin(obliquity)*z
+  ez = -math.sin(obliquity)*y + math.cos(obliquity)*z
+  cols['ecl_lon'] = csvStrings((numpy.arctan2(ey,x) / rpd) % 360.0)
+  cols['ecl_lat'] = csvStrings(numpy.arcsin(numpy.clip(ez,-1.0,1.0)) / rpd)
+
+  ### Apsis-Priam temperatures for brighter stars with BP,RP
+  hasTeff = hasBpRp & (g < 17.0)
+  teff = 3500.0 + 6000.0 * numpy.exp(-numpy.clip(color,0.0,None))
+  cols['priam_flags'] = ['%d' % (t and 100001 or 0,) for t in hasTeff.tolist()]
+  cols['teff_val'] = csvStrings(teff,hasTeff,fmt=lambda v: '%.2f' % (v,))
+  cols['teff_percentile_lower'] = csvStrings(teff*0.95,hasTeff,fmt=lambda v: '%.2f' % (v,))
+  cols['teff_percentile_upper'] = csvStrings(teff*1.05,hasTeff,fmt=lambda v: '%.2f' % (v,))
+
+  blank = [''] * n
+  return [','.join(row) for row in zip(*[cols.get(c,blank) for c in gaiaColumns])]
+
+
+def writeGaia(outdir, nRows, fileRows=27600, seed=2000):
+  """Write nRows stars to outdir/GaiaSource_N_M.csv.gz files of about
+fileRows rows each, and outdir/MD5SUM.txt; return list of (MD5
+checksum, GaiaSource_N_M) pairs
+
+Positions are drawn in chunks, each chunk's stars appended to a
+temporary file per level 2 HEALPix pixel; each pixel's stars are then
+sorted by source_id and written, so memory use is bounded by the
+largest pixel
+
+"""
+  rng = numpy.random.default_rng(seed)
+  tmpdir = os.path.join(outdir,'synthcat.tmp')
+  if not os.path.isdir(tmpdir): os.makedirs(tmpdir)
+  nBuckets = 12 << (2*2)
+  bucketPath = lambda bucket: os.path.join(tmpdir,'%03d.f8' % (bucket,))
+
+  ### Pass 1:  positions, by bucket, as (RA,DEC,pixel) triples
+  for chunk in range(0,nRows,1<<20):
+    ra,dec = skyPositions(rng,min(1<<20,nRows-chunk))
+    pix = healpixNest(ra,dec)
+    buckets = pix >> (bucketShift-35)
+    order = numpy.argsort(buckets,kind='stable')
+    triples = numpy.column_stack((ra,dec,pix.astype(numpy.float64),))[order]
+    bounds = numpy.searchsorted(buckets[order],numpy.arange(nBuckets+1))
+    for bucket in range(nBuckets):
+      if bounds[bucket] == bounds[bucket+1]: continue
+      with open(bucketPath(bucket),'ab') as f: triples[bounds[bucket]:bounds[bucket+1]].tofile(f)
+
+  ### Pass 2:  source_ids in order, rows, files of fileRows rows
+  md5s = list()
+  pending = list()
+
+  def flush(lines, ids):
+    pfx = 'GaiaSource_%d_%d' % (ids[0],ids[-1],)
+    path = os.path.join(outdir,'%s.csv.gz' % (pfx,))
+    with open(path,'wb') as fraw:
+      with gzip.GzipFile(filename='',mode='wb',compresslevel=6,fileobj=fraw,mtime=0) as fgz:
+        fgz.write(('%s\n' % (','.join(gaiaColumns),)).encode('8859'))
+        fgz.write(('%s\n' % ('\n'.join(lines),)).encode('8859'))
+    md5 = hashlib.md5()
+    with open(path,'rb') as f:
+      for block in iter(lambda: f.read(1<<20),b''): md5.update(block)
+    md5s.append((md5.hexdigest(),pfx,))
+
+  lines,ids = list(),list()
+  for bucket in range(nBuckets):
+    if not os.path.exists(bucketPath(bucket)): continue
+    triples = numpy.fromfile(bucketPath(bucket),dtype=numpy.float64).reshape(-1,3)
+    os.remove(bucketPath(bucket))
+    pix = triples[:,2].astype(numpy.int64)
+    order = numpy.argsort(pix,kind='stable')
+    ra,dec,pix = triples[order,0],triples[order,1],pix[order]
+    ### Running number within each pixel, with gaps
+    steps = rng.integers(1,1<<12,len(pix))
+    first = numpy.concatenate(([True],pix[1:] != pix[:-1]))
+    running = numpy.cumsum(steps)
+    running -= numpy.maximum.accumulate(numpy.where(first,running - steps,0))
+    sourceIds = (pix << 35) + running
+    for lo in range(0,len(pix),fileRows):
+      hi = lo + fileRows
+      lines.extend(gaiaRows(rng,ra[lo:hi],dec[lo:hi],sourceIds[lo:hi]))
+      ids.extend(sourceIds[lo:hi].tolist())
+      while len(lines) >= fileRows:
+        flush(lines[:fileRows],ids[:fileRows])
+        lines,ids = lines[fileRows:],ids[fileRows:]
+  if lines: flush(lines,ids)
+  shutil.rmtree(tmpdir)
+
+  with open(os.path.join(outdir,'MD5SUM.txt'),'w') as f:
+    for md5,pfx in md5s: f.write('%s  %s.csv.gz\n' % (md5,pfx,))
+  return md5s
+
+
+########################################################################
+### Harvard Binary Catalog
+
+def writeHbc(path, nStars, seed=2000):
+  """Write Harvard Binary Catalog file path with nStars stars, J2000,
+in RA order, in the layout of BSC5; return number of stars
+
+"""
+  rng = numpy.random.default_rng(seed)
+  ra,dec = skyPositions(rng,nStars)
+  order = numpy.argsort(ra,kind='stable')
+  ra,dec = ra[order],dec[order]
+  mags = numpy.round(bsc5Mags(rng,nStars) * 100.0).astype(int)
+  ### Proper motions, radians/year
+  pms = rng.normal(0.0,0.1 / 3600.0 * rpd,(2,nStars))
+  spectra = [s.encode() for s in rng.choice(['O9','B2','B9','A0','A5','F5','G2','G8','K0','K5','M2'],nStars)]
+
+  ### Header:  star0, star1, starn (<0 for J2000), stnum (1:  float
+  ### star number), mprop (1:  proper motion), nmag, nbent
+  nbent = 8 + 8 + 2 + 4 + 8 + 2
+  with open(path,'wb') as f:
+    f.write(struct.pack('<llllllL',0,1,-nStars,1,1,1,nbent))
+    for i,(r,d,mag,pmra,pmde,sp) in enumerate(zip((ra*rpd).tolist(),(dec*rpd).tolist(),mags.tolist()
+                                                  ,pms[0].tolist(),pms[1].tolist(),spectra)):
+      f.write(struct.pack('<fdd2shff',float(i+1),r,d,sp,mag,pmra,pmde))
+  return nStars
+
+
+########################################################################
+if __name__ == "__main__":
+
+  ######################################################################
+  ### Parse arguments
+
+  dikt = dict( tyc2=False
+             , gaia=False
+             , hbc=False
+             , all=False
+             , scale='1.0'
+             , outdir='.'
+             , seed='2000'
+             , gaiarows=''
+             , gaiafilerows='27600'
+             , hbcstars=''
+             )
+
+  for arg in sys.argv[1:]:
+
+    for key in dikt:
+
+      if arg == key and dikt[key] is False:
+        dikt[key] = True
+        break
+
+      dashkey = '--%s=' % key
+      L = len(dashkey)
+      if dashkey == arg[:L]:
+        dikt[key] = arg[L:]
+        break
+
+    else:
+      ### Unrecognised argument
+      sys.stderr.write('%s\nUnrecognised argument:  %s\n' % (__doc__,arg,))
+      sys.exit(1)
+
+  if not (dikt['tyc2'] or dikt['gaia'] or dikt['hbc'] or dikt['all']):
+    sys.stderr.write('%s\nNo catalog given:  tyc2, gaia, hbc or all\n' % (__doc__,))
+    sys.exit(1)
+
+  scale,seed,outdir = float(dikt['scale']),int(dikt['seed']),dikt['outdir']
+  if not os.path.isdir(outdir): os.makedirs(outdir)
+  doAll = dikt['all']
+
+  if doAll or dikt['tyc2']:
+    nCat,nSup = writeTyc2(outdir,int(round(scale*tyc2CatalogStars)),int(round(scale*tyc2Suppl1Stars)),seed)
+    sys.stderr.write('%d catalog.dat and %d suppl_1.dat stars written to %s\n' % (nCat,nSup,outdir,))
+
+  if doAll or dikt['gaia']:
+    nRows = dikt['gaiarows'] and int(dikt['gaiarows']) or int(round(scale*tyc2CatalogStars))
+    csvdir = os.path.join(outdir,'csv')
+    if not os.path.isdir(csvdir): os.makedirs(csvdir)
+    md5s = writeGaia(csvdir,nRows,int(dikt['gaiafilerows']),seed)
+    sys.stderr.write('%d Gaia rows in %d files written to %s\n' % (nRows,len(md5s),csvdir,))
+
+  if doAll or dikt['hbc']:
+    nStars = dikt['hbcstars'] and int(dikt['hbcstars']) or int(round(scale*bsc5Stars))
+    writeHbc(os.path.join(outdir,'BSC5'),nStars,seed)
+    sys.stderr.write('%d BSC5 stars written to %s\n' % (nStars,outdir,))
@@ -0,0 +1,917 @@
+"""
+Query Tycho-2 SQLite DB file (default tyc2.sqlite3), as written by
+tyc2_loadindex.py, from Python
+
+Usage:
+
+  import tyc2
+
+  tycho2 = tyc2.Tyc2Catalog('tyc2.sqlite3')
+
+  ### All *possible* stars from 56<RA<58, 23<DEC<25, mag<6.5 (Pleiades)
+  stars = tycho2.box(6.5, 56.0, 58.0, 23.0, 25.0)
+  print(stars['offset'], stars['xyz'], stars['mag'], stars['source'])
+
+  ### Same stars, in chunks of at most 1000
+  for chunk in tycho2.iterbox(6.5, 56.0, 58.0, 23.0, 25.0, chunkSize=1000):
+    print(len(chunk))
+
+  ### Only stars inside the box, with or without epoch
+  stars = tycho2.box(6.5, 56.0, 58.0, 23.0, 25.0, exact=True)
+
+  ### Stars within 1.5deg of RA,DEC = 56.75,24.12, mag<6.5
+  stars = tycho2.cone(tyc2.radecToXyz(56.75, 24.12), 1.5, 6.5)
+
+  ### Same, with positions propagated by proper motion to 2024.5
+  stars = tycho2.cone(tyc2.radecToXyz(56.75, 24.12), 1.5, 6.5, epoch=2024.5)
+
+  ### Stars on a rotated rectangular detector, given its corners, mag<9
+  corners = [tyc2.radecToXyz(ra, dec) for ra,dec in ((56.2,23.6),(57.6,23.9),(57.3,24.9),(55.9,24.6))]
+  stars = tycho2.polygon(corners, 9.0)
+
+  ### Both sources in one statement per box, in global magnitude order;
+  ### requires tyc2_loadindex.py reload unified
+  stars = tyc2.Tyc2Catalog('tyc2.sqlite3', unified=True).box(6.5, 56.0, 58.0, 23.0, 25.0)
+
+  ### Ten brightest stars, of either source, in a box; requires
+  ### tyc2_loadindex.py reload magsort
+  stars = tycho2.brightest(10, 6.5, 56.0, 58.0, 23.0, 25.0)
+
+  ### Many fields in one batch; result has an additional field column,
+  ### the index of each star's field in the list of boxes
+  stars = tycho2.fields(6.5, [(56.0,58.0,23.0,25.0),(83.0,85.0,-6.0,-4.0)])
+
+  ### Many Tycho identifiers in one batch; result has additional tycid
+  ### and index columns, the index of each star's identifier in the list
+  stars = tycho2.resolve(['TYC 1800-1944-1', '1800-2202-1', (1799,1281,1)])
+
+  ### Raw catalog.dat lines of stars, or their fields parsed to numbers;
+  ### requires paths in tyc2paths (tyc2_loadindex.py reload or loadallpaths)
+  catalog = stars[stars['source']=='catalog']
+  lines = tycho2.catlines(catalog['offset'])
+  fields = tycho2.catlines(catalog['offset'], parsed=True)
+  print(fields['TYC1'], fields['BTmag'], fields['VTmag'], fields['HIP'])
+
+  ### Same fields, for stars of either source, from the heavy DB; requires
+  ### tyc2_loadindex.py heavy
+  details = tycho2.details(stars, ['BTmag','VTmag','HIP'])
+
+  tycho2.close()
+
+Results are NumPy structured arrays with dtype tyc2.starDtype:
+
+  offset  - line offset of star in catalog.dat or in suppl_1.dat
+  xyz     - unit vector at RA,DEC
+  mag     - magnitude (see tyc2_loadindex.py)
+  source  - 'catalog' or 'suppl1'
+  field   - index of field (fields method only; dtype tyc2.fieldStarDtype)
+  tycid   - Tycho identifier, tyc2_loadindex.tycId (resolve method only;
+            dtype tyc2.tycStarDtype)
+  index   - index of identifier in list (resolve method only)
+
+Prerequisites:  NumPy; skybox.py; tyc2_loadindex.py; tyc2.sqlite3 from tyc2_loadindex.py reload
+
+"""
+import os
+import math
+import heapq
+import sqlite3
+import operator
+import itertools
+import numpy
+import skybox
+from tyc2_loadindex import magBin, tycId, getLineLength, lineFields, heavyPath, pmTables, tycTables, missingTables
+
+### Catalog table IDs; first characters match tyc2lib.c catalogORsuppl1
+sources = ('catalog','suppl1',)
+
+### Dtype of results, and of rows as SELECTed
+starDtype = numpy.dtype([('offset',numpy.int64)
+                        ,('xyz',numpy.float64,(3,))
+                        ,('mag',numpy.float64)
+                        ,('source','U7')
+                        ])
+fieldStarDtype = numpy.dtype(starDtype.descr + [('field',numpy.int64)])
+tycStarDtype = numpy.dtype(starDtype.descr + [('tycid',numpy.int64),('index',numpy.int64)])
+rowDtype = numpy.dtype([('offset',numpy.int64)
+                       ,('x',numpy.float64)
+                       ,('y',numpy.float64)
+                       ,('z',numpy.float64)
+                       ,('mag',numpy.float64)
+                       ])
+pmRowDtype = numpy.dtype(rowDtype.descr + [('pmra',numpy.float64),('pmde',numpy.float64)])
+
+### Epoch, Julian years, of Tycho-2 mean positions; proper motion units
+tyc2Epoch = 2000.0
+masPerDeg = 3600000.0
+
+### Query via index.dat regions; ?1 is himag, ?2 through ?5 are lora,
+### hira, lodec, hidec; same as tyc2_loadindex.py test option
+regionSelectFmt = """
+SELECT tyc2%(cos)s_uvs.offset
+      ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag%(pmcols)s
+FROM tyc2indexrtree
+INNER JOIN tyc2index
+   ON tyc2indexrtree.offset=tyc2index.offset
+INNER JOIN tyc2%(cos)s_uvs
+   ON tyc2%(cos)s_uvs.offset BETWEEN tyc2index.%(cos)sstart AND tyc2index.%(cos)send-1
+  AND tyc2%(cos)s_uvs.mag<?1%(cut)s%(pmjoin)s
+WHERE tyc2indexrtree.hira>?2
+  AND tyc2indexrtree.lora<?3
+  AND tyc2indexrtree.hidec>?4
+  AND tyc2indexrtree.lodec<?5
+ORDER BY tyc2%(cos)s_uvs.mag asc
+"""
+
+### Query via per-star R-Trees (tyc2_loadindex.py reload starrtree)
+starRtreeSelectFmt = """
+SELECT tyc2%(cos)s_uvs.offset
+      ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag%(pmcols)s
+FROM tyc2%(cos)s_starrtree
+INNER JOIN tyc2%(cos)s_uvs
+   ON tyc2%(cos)s_starrtree.offset=tyc2%(cos)s_uvs.offset
+  AND tyc2%(cos)s_uvs.mag<?1%(cut)s%(pmjoin)s
+WHERE tyc2%(cos)s_starrtree.lomag<?1
+  AND tyc2%(cos)s_starrtree.hira>?2
+  AND tyc2%(cos)s_starrtree.lora<?3
+  AND tyc2%(cos)s_starrtree.hidec>?4
+  AND tyc2%(cos)s_starrtree.lodec<?5
+ORDER BY tyc2%(cos)s_uvs.mag asc
+"""
+
+### Additional cone cut:  ?6 through ?8 are the cone axis unit vector,
+### ?9 is the cosine of the cone radius
+coneCutFmt = """
+  AND tyc2%(cos)s_uvs.x*?6+tyc2%(cos)s_uvs.y*?7+tyc2%(cos)s_uvs.z*?8>=?9"""
+
+### Additional proper motion columns (pmRA*cos(DEC), pmDE; mas/yr), for
+### queries at an epoch
+pmColsFmt = """ ,tyc2%(cos)s_pm.pmra ,tyc2%(cos)s_pm.pmde"""
+pmJoinFmt = """
+INNER JOIN tyc2%(cos)s_pm
+   ON tyc2%(cos)s_pm.offset=tyc2%(cos)s_uvs.offset"""
+
+def selectsBySource(fmt, cutFmt='', pm=False, cosList=sources):
+  """Return dict of SQL statements, by source, from format strings"""
+  def fmts(cos):
+    return dict(cos=cos
+               ,cut=cutFmt % dict(cos=cos)
+               ,pmcols=pm and pmColsFmt % dict(cos=cos) or ''
+               ,pmjoin=pm and pmJoinFmt % dict(cos=cos) or ''
+               )
+  return dict([(cos,fmt % fmts(cos),) for cos in cosList])
+
+regionSelect = selectsBySource(regionSelectFmt)
+starRtreeSelect = selectsBySource(starRtreeSelectFmt)
+regionConeSelect = selectsBySource(regionSelectFmt,coneCutFmt)
+starRtreeConeSelect = selectsBySource(starRtreeSelectFmt,coneCutFmt)
+regionPmSelect = selectsBySource(regionSelectFmt,pm=True)
+starRtreePmSelect = selectsBySource(starRtreeSelectFmt,pm=True)
+regionPmConeSelect = selectsBySource(regionSelectFmt,coneCutFmt,pm=True)
+starRtreePmConeSelect = selectsBySource(starRtreeSelectFmt,coneCutFmt,pm=True)
+
+### Query via unified TABLEs (tyc2_loadindex.py reload unified), as if
+### 'all' were one more source; one statement and one ORDER BY for both
+### sources, and each row ends with its source, an index into sources
+unifiedSource = 'all'
+unifiedSelectFmt = """
+SELECT tyc2%(cos)s_uvs.srcoffset
+      ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag%(pmcols)s
+      ,tyc2%(cos)s_uvs.source
+FROM tyc2indexrtree
+INNER JOIN tyc2%(cos)sindex
+   ON tyc2indexrtree.offset=tyc2%(cos)sindex.offset
+INNER JOIN tyc2%(cos)s_uvs
+   ON tyc2%(cos)s_uvs.offset BETWEEN tyc2%(cos)sindex.%(cos)sstart AND tyc2%(cos)sindex.%(cos)send-1
+  AND tyc2%(cos)s_uvs.mag<?1%(cut)s%(pmjoin)s
+WHERE tyc2indexrtree.hira>?2
+  AND tyc2indexrtree.lora<?3
+  AND tyc2indexrtree.hidec>?4
+  AND tyc2indexrtree.lodec<?5
+ORDER BY tyc2%(cos)s_uvs.mag asc
+"""
+
+unifiedSelects = [selectsBySource(unifiedSelectFmt,cutFmt,pm=pm,cosList=(unifiedSource,))
+                  for cutFmt,pm in (('',False,),(coneCutFmt,False,),('',True,),(coneCutFmt,True,),)
+                 ]
+
+### Magnitude-sorted regions (tyc2_loadindex.py reload magsort):  seq
+### ranges of regions in a box, ?1 is magBin(himag), ?2 through ?5 are
+### lora, hira, lodec, hidec; then stars of one seq range, in magnitude
+### order, ?3 is himag
+magRunsSelectFmt = """
+SELECT tyc2%(cos)s_magbreaks.seqstart ,tyc2%(cos)s_magbreaks.seqend
+FROM tyc2indexrtree
+INNER JOIN tyc2%(cos)s_magbreaks
+   ON tyc2%(cos)s_magbreaks.region=tyc2indexrtree.offset
+  AND tyc2%(cos)s_magbreaks.mag=?1
+WHERE tyc2indexrtree.hira>?2
+  AND tyc2indexrtree.lora<?3
+  AND tyc2indexrtree.hidec>?4
+  AND tyc2indexrtree.lodec<?5
+"""
+magRunSelectFmt = """
+SELECT offset ,x ,y ,z ,mag
+FROM tyc2%(cos)s_magsorted
+WHERE seq BETWEEN ?1 AND ?2-1
+  AND mag<?3
+ORDER BY seq
+"""
+
+magRunsSelect = selectsBySource(magRunsSelectFmt)
+magRunSelect = selectsBySource(magRunSelectFmt)
+
+### Batched fields:  TEMP TABLEs of field boxes, and of distinct
+### (field,region) pairs from joining those boxes to the index.dat
+### region R-Tree, so a region shared by several fields is read once;
+### CROSS JOIN makes SQLite search the R-Tree once per field
+fieldsCreate = (
+"""CREATE TEMP TABLE IF NOT EXISTS tyc2fields (fieldid INTEGER, lora double, hira double, lodec double, hidec double)"""
+,"""CREATE TEMP TABLE IF NOT EXISTS tyc2fieldregions (fieldid INTEGER, region INTEGER)"""
+,"""DELETE FROM temp.tyc2fields"""
+,"""DELETE FROM temp.tyc2fieldregions"""
+,)
+fieldsInsert = """INSERT INTO temp.tyc2fields VALUES (?,?,?,?,?)"""
+fieldRegionsInsert = """
+INSERT INTO temp.tyc2fieldregions
+SELECT DISTINCT tyc2fields.fieldid ,tyc2indexrtree.offset
+FROM temp.tyc2fields
+CROSS JOIN tyc2indexrtree
+WHERE tyc2indexrtree.hira>tyc2fields.lora
+  AND tyc2indexrtree.lora<tyc2fields.hira
+  AND tyc2indexrtree.hidec>tyc2fields.lodec
+  AND tyc2indexrtree.lodec<tyc2fields.hidec
+"""
+fieldRegionsSelect = """
+SELECT fieldid ,region FROM temp.tyc2fieldregions ORDER BY region ,fieldid
+"""
+
+### Stars of each distinct region, once; ?1 is himag
+fieldRegionStarsSelectFmt = """
+SELECT tyc2index.offset ,tyc2%(cos)s_uvs.offset
+      ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag
+FROM tyc2index
+INNER JOIN tyc2%(cos)s_uvs
+   ON tyc2%(cos)s_uvs.offset BETWEEN tyc2index.%(cos)sstart AND tyc2index.%(cos)send-1
+  AND tyc2%(cos)s_uvs.mag<?1
+WHERE tyc2index.offset IN (SELECT DISTINCT region FROM temp.tyc2fieldregions)
+ORDER BY tyc2index.offset
+"""
+
+### Per-star R-Tree:  join field boxes directly; ?1 is himag; CROSS JOIN
+### makes SQLite loop over the fields outermost, searching the R-Tree
+### once per field
+fieldStarRtreeSelectFmt = """
+SELECT tyc2fields.fieldid ,tyc2%(cos)s_uvs.offset
+      ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag
+FROM temp.tyc2fields
+CROSS JOIN tyc2%(cos)s_starrtree
+CROSS JOIN tyc2%(cos)s_uvs
+WHERE tyc2%(cos)s_starrtree.lomag<?1
+  AND tyc2%(cos)s_starrtree.hira>tyc2fields.lora
+  AND tyc2%(cos)s_starrtree.lora<tyc2fields.hira
+  AND tyc2%(cos)s_starrtree.hidec>tyc2fields.lodec
+  AND tyc2%(cos)s_starrtree.lodec<tyc2fields.hidec
+  AND tyc2%(cos)s_uvs.offset=tyc2%(cos)s_starrtree.offset
+  AND tyc2%(cos)s_uvs.mag<?1
+"""
+
+fieldRegionStarsSelect = selectsBySource(fieldRegionStarsSelectFmt)
+fieldStarRtreeSelect = selectsBySource(fieldStarRtreeSelectFmt)
+
+### Batched Tycho identifiers:  TEMP TABLE of tycids, keyed by index in
+### the caller's list; CROSS JOIN makes SQLite loop over the identifiers,
+### looking up each in the tyc2X_tyc B-Tree, then its offset in tyc2X_uvs
+tycidsCreate = (
+"""CREATE TEMP TABLE IF NOT EXISTS tyc2tycids (idx INTEGER PRIMARY KEY, tycid INTEGER)"""
+,"""DELETE FROM temp.tyc2tycids"""
+,)
+tycidsInsert = """INSERT INTO temp.tyc2tycids VALUES (?,?)"""
+tycStarsSelectFmt = """
+SELECT tyc2tycids.idx ,tyc2tycids.tycid ,tyc2%(cos)s_uvs.offset
+      ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag%(pmcols)s
+FROM temp.tyc2tycids
+CROSS JOIN tyc2%(cos)s_tyc
+   ON tyc2%(cos)s_tyc.tycid=tyc2tycids.tycid
+CROSS JOIN tyc2%(cos)s_uvs
+   ON tyc2%(cos)s_uvs.offset=tyc2%(cos)s_tyc.offset%(pmjoin)s
+ORDER BY tyc2tycids.idx
+"""
+
+tycStarsSelect = selectsBySource(tycStarsSelectFmt)
+tycStarsPmSelect = selectsBySource(tycStarsSelectFmt,pm=True)
+
+### Heavy DB (tyc2_loadindex.py heavy), ATTACHed on first use; TEMP
+### TABLE of offsets, keyed by index in the caller's stars, joined to
+### the tyc2X_heavy TABLE by its rowid, offset
+heavyAttach = """ATTACH DATABASE ? AS heavydb"""
+detailsCreate = (
+"""CREATE TEMP TABLE IF NOT EXISTS tyc2details (idx INTEGER PRIMARY KEY, offset INTEGER)"""
+,"""DELETE FROM temp.tyc2details"""
+,)
+detailsInsert = """INSERT INTO temp.tyc2details VALUES (?,?)"""
+detailsSelectFmt = """
+SELECT tyc2details.idx%(cols)s
+FROM temp.tyc2details
+CROSS JOIN heavydb.tyc2%(cos)s_heavy
+   ON tyc2%(cos)s_heavy.offset=tyc2details.offset
+"""
+
+### Path of catalog.dat or of suppl_1.dat, keyed by source
+pathSelect = """SELECT fullpath FROM tyc2paths WHERE key=? LIMIT 1"""
+
+### Radian per degree conversion factor
+rpd = skybox.rpd
+
+### Unit vector at RA,DEC in degrees
+radecToXyz = skybox.radecToXyz
+
+
+########################################################################
+def parseTyc(tyc):
+  """Return tycid (tyc2_loadindex.tycId) of Tycho identifier tyc:  a
+tycid integer; a (TYC1,TYC2,TYC3) sequence; or a string such as
+'TYC 1800-1944-1', '1800-1944-1' or '1800 01944 1'
+
+"""
+  if isinstance(tyc,str):
+    toks = tyc.upper().replace('TYC','').replace('-',' ').split()
+    assert len(toks) == 3, 'Bad Tycho identifier %s' % (repr(tyc),)
+    return tycId(*[int(tok) for tok in toks])
+  if hasattr(tyc,'__len__'): return tycId(*[int(v) for v in tyc])
+  return int(tyc)
+
+
+########################################################################
+def lineDtypes(source, lineLength):
+  """Return (record,parsed) dtypes for lines of source:  record dtype
+has field line, the line less termination, plus each field of
+tyc2_loadindex.lineFields[source], all as overlapping byte strings over
+lineLength bytes; parsed dtype has the same fields as numbers or strings
+
+"""
+  fields = lineFields[source]
+  width = fields[-1][2]
+  record = numpy.dtype(dict(names=['line']+[name for name,lo,hi,typ in fields]
+                           ,formats=['S%d' % (width,)]+['S%d' % (hi-lo,) for name,lo,hi,typ in fields]
+                           ,offsets=[0]+[lo for name,lo,hi,typ in fields]
+                           ,itemsize=lineLength
+                           ))
+  types = dict(f=numpy.float64,i=numpy.int64)
+  parsed = numpy.dtype([(name,types.get(typ,'S%d' % (hi-lo,)),) for name,lo,hi,typ in fields])
+  return record,parsed
+
+
+########################################################################
+def parseLines(records, parsedDtype):
+  """Convert record array from lineDtypes to parsedDtype array"""
+  parsed = numpy.empty(len(records),dtype=parsedDtype)
+  blanks = dict(f=b'nan',i=b'0')
+  for name in parsedDtype.names:
+    chars = numpy.char.strip(records[name])
+    if parsedDtype[name].kind in 'fi':
+      chars = numpy.where(chars==b'',blanks[parsedDtype[name].kind],chars)
+    parsed[name] = chars.astype(parsedDtype[name])
+  return parsed
+
+
+########################################################################
+def propagate(xyz, pmra, pmde, years):
+  """Return Nx3 array of unit vectors xyz (Nx3) moved by proper motions
+pmra (including cos(DEC)) and pmde, in mas/yr, over years; linear, in
+the tangent plane at each star, along local east and north vectors
+
+"""
+  x,y,z = xyz[:,0],xyz[:,1],xyz[:,2]
+  rho = numpy.hypot(x,y)
+  rho1 = numpy.where(rho > 0.0,rho,1.0)
+  east = numpy.column_stack((-y/rho1,x/rho1,numpy.zeros_like(x),))
+  north = numpy.column_stack((-z*x/rho1,-z*y/rho1,rho,))
+  scale = rpd * years / masPerDeg
+  moved = xyz + (east*pmra[:,None] + north*pmde[:,None]) * scale
+  return moved / numpy.sqrt((moved*moved).sum(axis=1))[:,None]
+
+
+########################################################################
+def inBox(xyz, lora, hira, lodec, hidec):
+  """Return boolean array, True where unit vector of xyz (Nx3) is in
+RA,DEC box (lora,hira,lodec,hidec), i.e. in any of skybox.radecBoxes, so
+RA limits may cross RA=0/360; strict comparisons, as in the R-Tree
+queries, e.g. to cut stars propagated by proper motion to the box
+
+"""
+  ra = (numpy.arctan2(xyz[:,1],xyz[:,0]) / rpd) % 360.0
+  dec = numpy.arcsin(numpy.clip(xyz[:,2],-1.0,1.0)) / rpd
+  inside = numpy.zeros(len(xyz),dtype=bool)
+  for blora,bhira,blodec,bhidec in skybox.radecBoxes(lora,hira,lodec,hidec):
+    inside |= (ra > blora) & (ra < bhira) & (dec > blodec) & (dec < bhidec)
+  return inside
+
+
+########################################################################
+def rowsToStars(rows, source, epoch=None):
+  """Convert list of SELECTed (offset,X,Y,Z,mag) rows to starDtype
+array; if epoch is not None, rows also have (...,pmRA,pmDE), and xyz
+are propagated from tyc2Epoch to epoch; if source is unifiedSource, rows
+end with the index of their source in sources
+
+"""
+  if source == unifiedSource:
+    ranks = numpy.array([row[-1] for row in rows],dtype=numpy.int64)
+    rows = [row[:-1] for row in rows]
+  if epoch is None: flat = numpy.array(rows,dtype=rowDtype)
+  else            : flat = numpy.array(rows,dtype=pmRowDtype)
+  stars = numpy.empty(len(flat),dtype=starDtype)
+  stars['offset'] = flat['offset']
+  for i,k in enumerate('xyz'): stars['xyz'][:,i] = flat[k]
+  stars['mag'] = flat['mag']
+  if source == unifiedSource: stars['source'] = numpy.array(sources)[ranks]
+  else                      : stars['source'] = source
+  if epoch is not None and len(flat):
+    stars['xyz'] = propagate(stars['xyz'],flat['pmra'],flat['pmde'],epoch-tyc2Epoch)
+  return stars
+
+
+########################################################################
+def starKeys(stars):
+  """Integer key of each star of starDtype array, unique across sources"""
+  keys = stars['offset'] * len(sources)
+  for rank,source in enumerate(sources): keys[stars['source']==source] += rank
+  return keys
+
+
+########################################################################
+def expandRegions(keys, stars, pairFields, pairKeys):
+  """Expand stars, grouped by ascending region key in keys, to one copy
+per (field,region) pair in pairFields and pairKeys; return (stars,fields)
+
+"""
+  los = numpy.searchsorted(keys,pairKeys,side='left')
+  counts = numpy.searchsorted(keys,pairKeys,side='right') - los
+  total = counts.sum()
+  ### Index of each output star:  for pair i, los[i] through los[i]+counts[i]-1
+  firsts = numpy.repeat(numpy.cumsum(counts) - counts,counts)
+  starts = numpy.repeat(los,counts)
+  indices = starts + numpy.arange(total) - firsts
+  return stars[indices],numpy.repeat(pairFields,counts)
+
+
+########################################################################
+class Tyc2Catalog(object):
+  """
+Read-only connection to Tycho-2 SQLite DB, kept open across queries
+
+Constructor:  Tyc2Catalog([sqlite3db[, starrtree[, unified]]])
+
+  sqlite3db:  path to DB; default is tyc2.sqlite3
+  starrtree:  if True, query per-star R-Trees instead of index.dat
+              regions; DB must be loaded with starrtree option
+  unified:    if True, box, iterbox and cone of both sources query the
+              unified TABLE with one statement per box, so stars are in
+              global magnitude order instead of by source; DB must be
+              loaded with unified option
+
+The SQL text of each query is constant, so the sqlite3 module's
+statement cache keeps each statement prepared across calls; only the
+parameters are re-bound.
+
+The fields method resolves a batch of boxes with one statement per
+source:  the boxes go into a TEMP TABLE, which is joined to the R-Tree,
+so each index.dat region is read only once however many fields overlap
+it.  The main DB is never written; TEMP TABLEs are in a separate DB.
+The resolve method likewise joins a TEMP TABLE of Tycho identifiers to
+the tyc2X_tyc TABLEs.
+
+The brightest method merges the magnitude-ordered runs of stars of
+each index.dat region (tyc2_loadindex.py reload magsort), and stops
+after the requested number of stars, so it reads only the bright end
+of each region.
+
+The polygon method fetches stars from the minimal RA,DEC box around a
+convex spherical polygon (skybox.polygonBoxes), then keeps only those
+inside every great-circle edge, with one NumPy matrix product.
+
+The box, iterbox, cone, polygon and resolve methods take an optional
+epoch, at which to return star positions, propagated by proper motion.
+
+The details method returns any of the fields of the heavy DB
+(tyc2_loadindex.py heavy), which is ATTACHed only on the first call, so
+queries that do not need those fields never read it.
+
+The catlines method memory-maps catalog.dat or suppl_1.dat once, at the
+path tyc2_loadindex.py wrote to TABLE tyc2paths, and keeps the map
+across calls, so looking up the lines of a whole query result is one
+NumPy indexing operation on pages already mapped, instead of the open,
+seek and close per star of tyc2lib.c tyc2_getCatline.
+
+Methods:  box; iterbox; cone; polygon; brightest; fields; resolve;
+          details; catlines; close.
+
+"""
+
+  def __init__(self, sqlite3db='tyc2.sqlite3', starrtree=False, unified=False):
+
+    self.sqlite3db = sqlite3db
+    self.starrtree = starrtree
+    self.unified = unified
+    if starrtree:
+      self.selects,self.coneSelects = starRtreeSelect,starRtreeConeSelect
+      self.pmSelects,self.pmConeSelects = starRtreePmSelect,starRtreePmConeSelect
+    else:
+      self.selects,self.coneSelects = regionSelect,regionConeSelect
+      self.pmSelects,self.pmConeSelects = regionPmSelect,regionPmConeSelect
+    if unified:
+      self.selects,self.coneSelects,self.pmSelects,self.pmConeSelects = [
+        dict(selects,**unified) for selects,unified in zip((self.selects,self.coneSelects,self.pmSelects,self.pmConeSelects,)
+                                                          ,unifiedSelects
+                                                          )]
+    self.pmMax = None
+    self.catfiles = dict()
+    self.heavyAttached = False
+
+    ### Open read-only via URI if possible
+    assert os.path.isfile(sqlite3db), '%s not found' % (sqlite3db,)
+    try:
+      uri = 'file:%s?mode=ro' % (os.path.abspath(sqlite3db),)
+      self.cn = sqlite3.connect(uri,uri=True,cached_statements=256)
+      self.uri = True
+    except TypeError:
+      self.cn = sqlite3.connect(sqlite3db,cached_statements=256)
+      self.uri = False
+    self.cn.execute("""PRAGMA query_only = ON""")
+
+  def close(self):
+    """Close DB connection"""
+    if self.cn: self.cn.close()
+    self.cn = None
+    self.catfiles = dict()
+    self.heavyAttached = False
+
+  def __enter__(self): return self
+  def __exit__(self, *args): self.close()
+
+  def requireTables(self, tables, what):
+    """Raise AssertionError, naming what is missing, unless DB has all of
+tables, which tyc2_loadindex.py reload writes
+
+"""
+    missing = missingTables(self.cn,tables)
+    assert not missing, '%s has no %s (%s); run tyc2_loadindex.py reload' % (self.sqlite3db,what,' '.join(missing),)
+
+  def pmMargin(self, source, epoch):
+    """Degrees that any star of source may move between tyc2Epoch and
+epoch, from the upper limit of proper motion written by tyc2_loadindex.py
+
+"""
+    if self.pmMax is None:
+      self.requireTables(pmTables,'proper motions')
+      self.pmMax = dict(self.cn.execute("""SELECT tableid,pmmax FROM tyc2pmmax""").fetchall())
+    return self.pmMax[source] * abs(epoch - tyc2Epoch) / masPerDeg
+
+  def querySources(self, wanted):
+    """Sources to query in turn for wanted sources:  unifiedSource alone,
+if unified and wanted are all sources; else wanted
+
+"""
+    if self.unified and set(wanted) == set(sources): return (unifiedSource,)
+    return wanted
+
+  def boxQuery(self, lora, hira, lodec, hidec, source, epoch):
+    """Return SQL and list of boxes for box or iterbox; with epoch, the
+boxes are grown by pmMargin, and the SQL also SELECTs proper motions
+
+"""
+    if epoch is None:
+      return self.selects[source],skybox.radecBoxes(lora,hira,lodec,hidec)
+    return self.pmSelects[source],skybox.growBox(lora,hira,lodec,hidec,self.pmMargin(source,epoch))
+
+  def iterbox(self, himag, lora, hira, lodec, hidec, sources=sources, chunkSize=65536, epoch=None, exact=False):
+    """Yield starDtype arrays of at most chunkSize stars, from each of
+sources in turn, matching magnitude and RA,DEC limits; stars from each
+source (or, if unified, all stars) are in ascending magnitude order
+within each box from skybox.radecBoxes, i.e. a box that crosses
+RA=0/360 yields the stars of its two halves in turn; see box for epoch
+and exact
+
+"""
+    for source in self.querySources(sources):
+      sql,boxes = self.boxQuery(lora,hira,lodec,hidec,source,epoch)
+      seen = set()
+      key = source == unifiedSource and operator.itemgetter(0,-1) or operator.itemgetter(0)
+      for box in boxes:
+        cu = self.cn.execute(sql,(himag,)+box)
+        while True:
+          rows = cu.fetchmany(chunkSize)
+          if not rows: break
+          if len(boxes) > 1:
+            ### Boxes may share index.dat regions:  skip duplicate stars
+            rows = [row for row in rows if key(row) not in seen]
+            seen.update([key(row) for row in rows])
+            if not rows: continue
+          stars = rowsToStars(rows,source,epoch)
+          if exact:
+            stars = stars[inBox(stars['xyz'],lora,hira,lodec,hidec)]
+            if not len(stars): continue
+          yield stars
+        cu.close()
+
+  def box(self, himag, lora, hira, lodec, hidec, sources=sources, epoch=None, exact=False):
+    """Return starDtype array of stars matching magnitude and RA,DEC
+limits; stars from each source are in ascending magnitude order, or,
+if unified, all stars are
+
+RA limits may cross RA=0/360, e.g. lora=350 and hira=10; see
+skybox.radecBoxes.
+
+These are all *possible* stars:  all stars of the index.dat regions
+that meet the box.  If exact is True, only stars with
+xyz inside the box are kept (inBox).
+
+If epoch (Julian years, e.g. 2024.5) is not None, xyz are propagated by
+proper motion from tyc2Epoch to epoch, and the box is first grown by
+the maximum proper motion over that span (skybox.growBox), so no star
+that may have moved into the box is missed; exact then applies to the
+propagated xyz.
+
+"""
+    results = list()
+    for source in self.querySources(sources):
+      sql,boxes = self.boxQuery(lora,hira,lodec,hidec,source,epoch)
+      stars = self.boxesStars(sql,boxes,(himag,),(),source,epoch)
+      if exact: stars = stars[inBox(stars['xyz'],lora,hira,lodec,hidec)]
+      results.append(stars)
+    return numpy.concatenate(results)
+
+  def boxesStars(self, sql, boxes, head, tail, source, epoch=None):
+    """Return starDtype array of stars from one source, SELECTed with
+parameters head+box+tail for each box in boxes, in magnitude order
+
+"""
+    stars = numpy.concatenate([rowsToStars(self.cn.execute(sql,head+box+tail).fetchall(),source,epoch)
+                               for box in boxes
+                              ] or [numpy.empty(0,dtype=starDtype)])
+    if len(boxes) > 1:
+      ### Boxes may share index.dat regions:  remove duplicate stars,
+      ### then restore magnitude order
+      stars = stars[numpy.unique(starKeys(stars),return_index=True)[1]]
+      stars = stars[numpy.argsort(stars['mag'],kind='mergesort')]
+    return stars
+
+  def cone(self, xyz, radius, himag, sources=sources, epoch=None):
+    """Return starDtype array of stars within radius degrees of unit
+vector xyz, with magnitude less than himag; stars from each source are
+in ascending magnitude order, or, if unified, all stars are
+
+The R-Tree prefilter uses the boxes from skybox.coneBoxes(xyz,radius); the
+exact cut, dot(star,xyz) >= cos(radius), is done by SQLite, so only
+stars inside the cone are returned to Python.
+
+If epoch is not None (see box), SQLite cuts at radius plus the maximum
+proper motion over the epoch span, and the exact cut is done on the
+propagated xyz with NumPy.
+
+"""
+    norm = math.sqrt(sum([v*v for v in xyz]))
+    axis = tuple([v/norm for v in xyz])
+    results = list()
+    for source in self.querySources(sources):
+      if epoch is None:
+        cut = axis + (math.cos(rpd*radius),)
+        boxes = skybox.coneBoxes(axis,radius)
+        results.append(self.boxesStars(self.coneSelects[source],boxes,(himag,),cut,source))
+        continue
+      grown = radius + self.pmMargin(source,epoch)
+      cut = axis + (math.cos(rpd*min(grown,180.0)),)
+      boxes = skybox.coneBoxes(axis,grown)
+      stars = self.boxesStars(self.pmConeSelects[source],boxes,(himag,),cut,source,epoch)
+      results.append(stars[stars['xyz'].dot(axis) >= math.cos(rpd*radius)])
+    return numpy.concatenate(results)
+
+  def polygon(self, corners, himag, sources=sources, epoch=None):
+    """Return starDtype array of stars inside the convex spherical
+polygon with vertices corners, e.g. the four corner unit vectors of a
+rotated rectangular field of view, in order around it in either
+direction, with magnitude less than himag; stars from each source are
+in ascending magnitude order, or, if unified, all stars are
+
+Stars are fetched from the boxes of skybox.polygonBoxes(corners), grown
+by the maximum proper motion if epoch is not None (see box), and cut
+exactly to those on the inner side of each edge's great circle,
+dot(xyz,normal) >= 0 for all normals from skybox.polygonNormals, with
+the (propagated) xyz of all stars in one NumPy matrix product.
+
+"""
+    normals = numpy.array(skybox.polygonNormals(corners))
+    results = list()
+    for source in self.querySources(sources):
+      if epoch is None:
+        sql,boxes = self.selects[source],skybox.polygonBoxes(corners)
+      else:
+        margin = self.pmMargin(source,epoch)
+        sql,boxes = self.pmSelects[source],[grown for box in skybox.polygonBoxes(corners)
+                                                  for grown in skybox.growBox(*box+(margin,))
+                                           ]
+      stars = self.boxesStars(sql,boxes,(himag,),(),source,epoch)
+      results.append(stars[(stars['xyz'].dot(normals.T) >= 0.0).all(axis=1)])
+    return numpy.concatenate(results)
+
+  def brightest(self, n, himag, lora, hira, lodec, hidec, sources=sources):
+    """Return starDtype array of the n brightest stars, from all of
+sources, matching magnitude and RA,DEC limits, in ascending magnitude
+order; like box, these are all *possible* stars of index.dat regions
+
+"""
+    def runRows(source,seqstart,seqend):
+      for row in self.cn.execute(magRunSelect[source],(seqstart,seqend,himag,)):
+        yield (row[4],source,row,)
+
+    runs = list()
+    for source in sources:
+      sourceRuns = set()
+      for box in skybox.radecBoxes(lora,hira,lodec,hidec):
+        sourceRuns.update(self.cn.execute(magRunsSelect[source],(magBin(himag),)+box).fetchall())
+      runs.extend([runRows(source,*run) for run in sorted(sourceRuns)])
+
+    stars = numpy.empty(0,dtype=starDtype)
+    merged = list(itertools.islice(heapq.merge(*runs),n))
+    for source in sources:
+      rows = [row for mag,rowSource,row in merged if rowSource==source]
+      stars = numpy.concatenate((stars,rowsToStars(rows,source),))
+    return stars[numpy.argsort(stars['mag'],kind='mergesort')]
+
+  def fields(self, himag, boxes, sources=sources):
+    """Return fieldStarDtype array of stars matching magnitude limit
+and any of boxes, a sequence of (lora,hira,lodec,hidec) fields; each
+star is tagged with the index of its field in boxes, and appears once
+per field that it matches.  Results are in field order, then by source,
+then in ascending magnitude order, i.e. the same as concatenating
+box(himag,*boxes[i]) for each field i, plus the field column
+
+"""
+    fieldRows = [(fieldid,) + box
+                 for fieldid,field in enumerate(boxes)
+                 for box in skybox.radecBoxes(*field)
+                ]
+
+    ### query_only also applies to TEMP TABLEs; the main DB stays read-only
+    self.cn.execute("""PRAGMA query_only = OFF""")
+    try:
+      for sql in fieldsCreate: self.cn.execute(sql)
+      self.cn.executemany(fieldsInsert,fieldRows)
+      if not self.starrtree:
+        self.cn.execute(fieldRegionsInsert)
+        pairs = numpy.array(self.cn.execute(fieldRegionsSelect).fetchall(),dtype=numpy.int64).reshape((-1,2,))
+      self.cn.commit()
+    finally:
+      self.cn.execute("""PRAGMA query_only = ON""")
+
+    results = list()
+    for source in sources:
+      if self.starrtree:
+        rows = self.cn.execute(fieldStarRtreeSelect[source],(himag,)).fetchall()
+        keys = numpy.array([row[0] for row in rows],dtype=numpy.int64)
+        stars = rowsToStars([row[1:] for row in rows],source)
+        fieldids = keys
+      else:
+        rows = self.cn.execute(fieldRegionStarsSelect[source],(himag,)).fetchall()
+        keys = numpy.array([row[0] for row in rows],dtype=numpy.int64)
+        stars,fieldids = expandRegions(keys,rowsToStars([row[1:] for row in rows],source)
+                                      ,pairs[:,0],pairs[:,1]
+                                      )
+      fieldStars = numpy.empty(len(stars),dtype=fieldStarDtype)
+      for name in starDtype.names: fieldStars[name] = stars[name]
+      fieldStars['field'] = fieldids
+      results.append(fieldStars)
+
+    ### Order by field, then source, then magnitude
+    fieldStars = numpy.concatenate(results)
+    sourceRanks = numpy.zeros(len(fieldStars),dtype=numpy.int64)
+    for rank,source in enumerate(sources): sourceRanks[fieldStars['source']==source] = rank
+    return fieldStars[numpy.lexsort((fieldStars['mag'],sourceRanks,fieldStars['field'],))]
+
+  def resolve(self, tycs, sources=sources, epoch=None):
+    """Return tycStarDtype array of stars with Tycho identifiers tycs, a
+sequence of anything parseTyc accepts, e.g. thousands of 'TYC1-TYC2-TYC3'
+strings; each star is tagged with its tycid and with the index of its
+identifier in tycs.  Results are in index order; identifiers not found
+in any of sources are omitted.  See box for epoch.
+
+"""
+    self.requireTables(tycTables,'Tycho identifiers')
+    if epoch is not None: self.requireTables(pmTables,'proper motions')
+    tycidRows = [(index,parseTyc(tyc),) for index,tyc in enumerate(tycs)]
+
+    ### query_only also applies to TEMP TABLEs; the main DB stays read-only
+    self.cn.execute("""PRAGMA query_only = OFF""")
+    try:
+      for sql in tycidsCreate: self.cn.execute(sql)
+      self.cn.executemany(tycidsInsert,tycidRows)
+      self.cn.commit()
+    finally:
+      self.cn.execute("""PRAGMA query_only = ON""")
+
+    results = list()
+    selects = epoch is None and tycStarsSelect or tycStarsPmSelect
+    for source in sources:
+      rows = self.cn.execute(selects[source]).fetchall()
+      stars = rowsToStars([row[2:] for row in rows],source,epoch)
+      tycStars = numpy.empty(len(stars),dtype=tycStarDtype)
+      for name in starDtype.names: tycStars[name] = stars[name]
+      tycStars['index'] = [row[0] for row in rows]
+      tycStars['tycid'] = [row[1] for row in rows]
+      results.append(tycStars)
+
+    tycStars = numpy.concatenate(results)
+    return tycStars[numpy.argsort(tycStars['index'],kind='mergesort')]
+
+  def attachHeavy(self):
+    """ATTACH heavy DB, read-only, beside main DB, once"""
+    if self.heavyAttached: return
+    path = heavyPath(self.sqlite3db)
+    assert os.path.isfile(path), '%s not found; run tyc2_loadindex.py heavy' % (path,)
+    ### A URI is a filename too, unless the connection was opened with
+    ### uri=True:  ATTACH the plain path then, not a new empty file
+    ### named file:...?mode=ro
+    if self.uri: self.cn.execute(heavyAttach,('file:%s?mode=ro' % (os.path.abspath(path),),))
+    else       : self.cn.execute(heavyAttach,(path,))
+    self.heavyAttached = True
+
+  def details(self, stars, columns=None):
+    """Return array, one element per star of starDtype array stars, of
+heavy DB columns, names from tyc2_loadindex.lineFields, e.g. ['BTmag',
+'VTmag','HIP']; default is all columns of the sources of stars.  Values
+are NaN (float), 0 (integer) or empty (string) where blank, or where a
+column does not exist for the source of a star, e.g. pflag for suppl1
+
+"""
+    present = [source for source in sources if (stars['source']==source).any()]
+    types = dict()
+    for source in sources:
+      for name,lo,hi,typ in lineFields[source]: types.setdefault(name,(typ,hi-lo,))
+    if columns is None:
+      columns = [name for source in present or sources for name,lo,hi,typ in lineFields[source]]
+      columns = [name for i,name in enumerate(columns) if name not in columns[:i]]
+    for name in columns: assert name in types, 'Unknown column %s' % (repr(name),)
+    dtypes = dict(f=numpy.float64,i=numpy.int64)
+    result = numpy.zeros(len(stars),dtype=[(name,dtypes.get(types[name][0],'S%d' % (types[name][1],)),) for name in columns])
+    for name in columns:
+      if types[name][0] == 'f': result[name] = numpy.nan
+
+    self.attachHeavy()
+    for source in present:
+      names = [name for name,lo,hi,typ in lineFields[source] if name in columns]
+      indices = numpy.flatnonzero(stars['source']==source)
+
+      ### query_only also applies to TEMP TABLEs; the main DB stays read-only
+      self.cn.execute("""PRAGMA query_only = OFF""")
+      try:
+        for sql in detailsCreate: self.cn.execute(sql)
+        self.cn.executemany(detailsInsert,zip(indices.tolist(),stars['offset'][indices].tolist()))
+        self.cn.commit()
+      finally:
+        self.cn.execute("""PRAGMA query_only = ON""")
+
+      sql = detailsSelectFmt % dict(cos=source
+                                   ,cols=''.join([' ,tyc2%s_heavy.%s' % (source,name,) for name in names])
+                                   )
+      rows = self.cn.execute(sql).fetchall()
+      if not rows: continue
+      rowIndices = numpy.array([row[0] for row in rows],dtype=numpy.int64)
+      for i,name in enumerate(names):
+        values = [row[i+1] for row in rows]
+        blank = dict(f=numpy.nan,i=0,s='')[types[name][0]]
+        result[name][rowIndices] = [blank if value is None else value for value in values]
+    return result
+
+  def catfile(self, source):
+    """Memory-mapped record array (see lineDtypes) of lines of source,
+at the path in TABLE tyc2paths; cached across calls
+
+"""
+    if source not in self.catfiles:
+      rows = self.cn.execute(pathSelect,(source,)).fetchall()
+      assert rows, 'No %s path in tyc2paths; run tyc2_loadindex.py loadallpaths' % (source,)
+      path = rows[0][0]
+      lineLength = getLineLength(path)
+      nLines,partial = divmod(os.path.getsize(path),lineLength)
+      assert 0 == partial, '%s is not fixed-width' % (path,)
+      record,parsed = lineDtypes(source,lineLength)
+      self.catfiles[source] = (numpy.memmap(path,dtype=record,mode='r',shape=(nLines,)),parsed,)
+    return self.catfiles[source]
+
+  def catlines(self, offsets, source='catalog', parsed=False):
+    """Return lines of source at offsets, e.g. stars['offset'] of stars
+from one source:  by default, as an array of byte strings, less line
+termination; if parsed is True, as an array with a field for each of
+tyc2_loadindex.lineFields[source], e.g. BTmag, VTmag, HIP, where blank
+numbers are NaN (float) or 0 (integer)
+
+Offsets may also be a slice, e.g. slice(0,1000), for which the raw
+lines are a view of the memory-mapped file, without copying.
+
+"""
+    records,parsedDtype = self.catfile(source)
+    if isinstance(offsets,slice): selected = records[offsets]
+    else                        : selected = records[numpy.asarray(offsets,dtype=numpy.int64)]
+    if parsed: return parseLines(selected,parsedDtype)
+    return selected['line']
@@ -3,12 +3,41 @@
 Put Tycho-2 main and supplement 1 catalogs and index into
 SQLite DB file (default tyc2.sqlite3) using SQLite R-Tree module
 
-Creates four TABLEs:
+Creates nine TABLEs:
 
   tyc2indexrtree  - Index R-Tree
   tyc2index       - Index table
   tyc2catalog_uvs - Main catalog subset, magnitude and unit vector at RA,DEC
   tyc2suppl1_uvs  - Supplemental 1 catalog subset, mag and unit vector at RA,DEC
+  tyc2catalog_pm  - Main catalog proper motions, pmRA*cos(DEC) and pmDE, mas/yr
+  tyc2suppl1_pm   - Supplemental 1 catalog proper motions
+  tyc2catalog_tyc - Main catalog offset by Tycho identifier (see tycId below)
+  tyc2suppl1_tyc  - Supplemental 1 catalog offset by Tycho identifier
+  tyc2pmmax       - Upper limit of total proper motion of each catalog
+
+and, with option starrtree, two more:
+
+  tyc2catalog_starrtree - Per-star R-Tree (offset,RA,RA,DEC,DEC,mag,mag)
+  tyc2suppl1_starrtree  - Per-star R-Tree for supplemental 1 catalog
+
+and, with option magsort, four more:
+
+  tyc2catalog_magsorted - Main catalog subset, in magnitude order by region
+  tyc2suppl1_magsorted  - Supplemental 1 catalog subset, likewise
+  tyc2catalog_magbreaks - Per-region magnitude breakpoints into magsorted
+  tyc2suppl1_magbreaks  - Likewise, for supplemental 1 catalog
+
+and, with option unified, three more:
+
+  tyc2all_uvs           - Both catalogs' subsets in one TABLE, by region
+  tyc2all_pm            - Their proper motions, keyed likewise
+  tyc2allindex          - Index table, start and end+1 offsets into tyc2all_uvs
+
+and, with option heavy, two TABLEs in a second DB file (default
+tyc2_heavy.sqlite3; see heavyPath below):
+
+  tyc2catalog_heavy     - All fields of each catalog.dat line, by offset
+  tyc2suppl1_heavy      - All fields of each suppl_1.dat line, by offset
 
 
 Usage:
@@ -17,9 +46,66 @@ Usage:
                            [--index=index.dat] \\
                            [--catalog=catalog.dat] \\
                            [--suppl1=suppl_1.dat] \\
-                           [reload] \\
+                           [reload [numpy] [--jobs=1] [--gzdir=DIR]] \\
                            [loadallpaths] \\
-                           [test[plot]]
+                           [test[plot]] \\
+                           [starrtree] \\
+                           [magsort [--limit=N]] \\
+                           [unified] \\
+                           [heavy] \\
+                           [migrate]
+
+  numpy:  parse catalog.dat and suppl_1.dat via NumPy arrays over
+          memory-mapped files instead of line by line; requires NumPy
+
+  --jobs=N:  parse catalog.dat and suppl_1.dat as line-aligned ranges
+             in a pool of N processes; rows are still written to the
+             SQLite DB in offset order by this process
+
+  --gzdir=DIR:  with reload, read index.dat, suppl_1.dat and catalog.dat
+                from their .gz pieces (index.dat.gz, suppl_1.dat.gz,
+                tyc2.dat.NN.gz) in DIR, a local directory or mirror URL,
+                decompressing them as they are parsed, instead of from
+                decompressed files; see httpgunzip.gunzipLines.  The
+                numpy and --jobs options, which need seekable files,
+                are ignored
+
+  starrtree:  with reload, also put each star into a 3-D R-Tree of
+              RA, DEC and magnitude; with test[plot], query those
+              R-Trees instead of the index.dat regions.  The test
+              option writes the query time to STDERR, so the two
+              schemas can be compared
+
+  test[plot]:  query stars with mag<--himag=6.5 (9.0 for suppl_1.dat)
+               in the box --lora=56 --hira=58 --lodec=23 --hidec=25;
+               --lora may exceed --hira, or be negative, for a box that
+               crosses RA=0/360 (see skybox.py)
+
+  magsort:  with reload, also write copies of the catalog TABLEs with the
+            stars of each index.dat region in magnitude order, plus
+            magnitude breakpoints of each region (see createMagSorted
+            below); with test[plot], query those copies, reading only
+            the bright end of each region
+
+  --limit=N:  with test[plot], list only the N brightest stars of each
+              catalog; with magsort, the sorted runs of the regions
+              are merged, and reading stops after N stars
+
+  unified:  with reload, also write both catalogs into one TABLE,
+            tyc2all_uvs, with a source column, plus its own index.dat
+            region mapping (see createUnified below), so tyc2.py
+            Tyc2Catalog(unified=True) queries both with one statement
+            and one ORDER BY, i.e. in global magnitude order
+
+  heavy:  write every field of catalog.dat and suppl_1.dat (BT and VT
+          magnitudes, errors, flags, HIP, ...; see lineFields below),
+          keyed by the same offsets, to a separate DB, so the main DB
+          stays small; tyc2.py Tyc2Catalog.details ATTACHes it only
+          when called.  May be used with or without reload
+
+  migrate:  convert, in place, tables of a DB written before schema
+            version 2 (see schemaVersion below), where offset was a
+            separate primary key instead of an alias for the rowid
 
 Prerequisites:
 
@@ -48,11 +134,573 @@ Prerequisites:
       | gunzip > catalog.dat
 
 """
+import os
+import sys
+import math
+import bisect
+import operator
+import itertools
+
+
+########################################################################
+def getLineLength(path):
+  """Length, including line termination, of first line of a fixed-width
+catalog file; all lines of catalog.dat and of suppl_1.dat are the same
+length
+
+"""
+  with open(path,'rb') as f: return len(f.readline())
+
+
+########################################################################
+### Names of files as distributed, GZIPped, by CDS; see httpgunzip.py
+gzNames = dict(index='index.dat', suppl1='suppl_1.dat', catalog='tyc2.dat')
+
+def openLines(path, key, gzdir=''):
+  """Open file at path for reading lines; or, if gzdir is not empty,
+stream lines of file named gzNames[key] from its .gz pieces in gzdir
+
+"""
+  if not gzdir: return open(path,'r')
+  import httpgunzip
+  pieces = httpgunzip.listNNgz(gzNames[key],gzdir)
+  assert pieces, 'No %s .gz pieces found in %s' % (gzNames[key],gzdir,)
+  return httpgunzip.gunzipLines(pieces)
+
+
+########################################################################
+### Schema version, stored in the DB via PRAGMA user_version
+### - 0:  offset int primary key; separate B-Tree beside rowid B-Tree
+### - 2:  offset INTEGER PRIMARY KEY; offset is the rowid, so the
+###       tyc2index region JOINs are rowid range scans
+schemaVersion = 2
+
+### Column definitions of TABLEs keyed by offset
+tableColumns = dict(tyc2index='catalogstart int, suppl1start int, catalogend int, suppl1end int'
+                   ,tyc2catalog_uvs='x double, y double, z double,mag double'
+                   ,tyc2suppl1_uvs='x double, y double, z double,mag double'
+                   ,tyc2catalog_pm='pmra double, pmde double'
+                   ,tyc2suppl1_pm='pmra double, pmde double'
+                   ,tyc2allindex='allstart int, allend int'
+                   ,tyc2all_uvs='source int, srcoffset int, x double, y double, z double, mag double'
+                   ,tyc2all_pm='pmra double, pmde double'
+                   )
+
+### Upper limit, |pmRA|+|pmDE|, of total proper motion of each catalog,
+### to grow query boxes
+pmMaxColumns = 'tableid varchar(16) primary key, pmmax double'
+
+### Tycho identifier TABLEs, tyc2X_tyc, are keyed by tycid, so each
+### TABLE is itself the index from identifier to offset:  one B-Tree of
+### two integers per star, and no separate INDEX
+tycColumns = 'tycid INTEGER PRIMARY KEY, offset int'
+
+### TABLEs of proper motions, and of Tycho identifiers, written by
+### reload; DBs loaded before these were added lack them, and migrate
+### cannot derive them from the other TABLEs
+pmTables = 'tyc2pmmax tyc2catalog_pm tyc2suppl1_pm'.split()
+tycTables = 'tyc2catalog_tyc tyc2suppl1_tyc'.split()
+
+
+########################################################################
+def tycId(tyc1, tyc2, tyc3):
+  """Tycho identifier TYC1-TYC2-TYC3 as one integer, the key of the
+tyc2X_tyc TABLEs:  TYC1 (1-9537) * 1000000 + TYC2 (1-99999) * 10 + TYC3
+
+"""
+  return tyc1*1000000 + tyc2*10 + tyc3
+
+
+########################################################################
+def missingTables(cn, tables):
+  """List of those of tables that are not in DB of connection cn"""
+  present = set([row[0] for row in cn.execute("""SELECT name FROM sqlite_master WHERE type='table'""")])
+  return [table for table in tables if table not in present]
+
+
+########################################################################
+def createTable(cu, table, suffix=''):
+  """CREATE TABLE table+suffix, at current schema version"""
+  cu.execute("""CREATE TABLE IF NOT EXISTS %s%s (offset INTEGER PRIMARY KEY,%s)""" % (table,suffix,tableColumns[table],))
+
+
+########################################################################
+def createMagIndexes(cu):
+  """Create INDEX for each magnitude"""
+  for tableid in 'catalog suppl1'.split():
+    table = """tyc2%s_uvs""" % (tableid,)
+    s ="""CREATE INDEX IF NOT EXISTS %(tableid)s_mag ON %(table)s (mag)""" % dict(tableid=tableid,table=table)
+    sys.stderr.write( "%s\n" % (s,) )
+    cu.execute(s)
+
+
+########################################################################
+### Magnitude-sorted copies of catalog TABLEs (reload magsort):
+### - tyc2X_magsorted:  stars of each index.dat region stored together,
+###   in ascending magnitude order, keyed by seq (the rowid)
+### - tyc2X_magbreaks:  for each region and each whole magnitude M in
+###   magBins, the seq range [seqstart:seqend) of the region's stars
+###   with mag<M, so a query reads only the bright end of each region
+magBins = list(range(-2,22))
+
+def magBin(himag):
+  """Smallest whole magnitude in magBins that is not less than himag"""
+  return min(max(int(math.ceil(himag)),magBins[0]),magBins[-1])
+
+
+def createMagSorted(cu, tableid):
+  """Write tyc2X_magsorted and tyc2X_magbreaks from tyc2index and
+tyc2X_uvs, where X is tableid (catalog or suppl1)
+
+"""
+  dikt = dict(cos=tableid)
+  cu.execute("""CREATE TABLE tyc2%(cos)s_magsorted (seq INTEGER PRIMARY KEY, offset int, x double, y double, z double, mag double)""" % dikt)
+  cu.execute("""CREATE TABLE tyc2%(cos)s_magbreaks (region int, mag int, seqstart int, seqend int, PRIMARY KEY (region,mag))""" % dikt)
+  cu.execute("""SELECT offset,%(cos)sstart,%(cos)send FROM tyc2index ORDER BY offset""" % dikt)
+  seq = 0
+  for region,start,end in cu.fetchall():
+    cu.execute("""SELECT offset,x,y,z,mag FROM tyc2%(cos)s_uvs WHERE offset BETWEEN ? AND ? ORDER BY mag,offset""" % dikt,(start,end-1,))
+    rows = cu.fetchall()
+    mags = [row[4] for row in rows]
+    cu.executemany("""INSERT INTO tyc2%(cos)s_magsorted VALUES (?,?,?,?,?,?)""" % dikt
+                  ,[(seq+i,)+row for i,row in enumerate(rows)]
+                  )
+    cu.executemany("""INSERT INTO tyc2%(cos)s_magbreaks VALUES (?,?,?,?)""" % dikt
+                  ,[(region,M,seq,seq+bisect.bisect_left(mags,M),) for M in magBins]
+                  )
+    seq += len(rows)
+  sys.stderr.write('%d records written for tyc2%s_magsorted\n' % (seq,tableid,))
+
+
+########################################################################
+### Unified TABLEs (reload unified):  the stars of each index.dat region,
+### those of catalog.dat then those of suppl_1.dat, stored together in
+### tyc2all_uvs, keyed by offset (the rowid), with source (index into
+### 'catalog suppl1'.split()) and srcoffset (the line offset in the
+### source file); region R is tyc2all_uvs offsets from
+### catalogstart+suppl1start to catalogend+suppl1end-1 of tyc2index,
+### written to tyc2allindex
+unifiedTables = 'tyc2allindex tyc2all_uvs tyc2all_pm'.split()
+
+### Rows of one source for tyc2all_uvs and tyc2all_pm:  unified offset is
+### the source offset plus the count of the other source's stars in
+### preceding regions (suppl1start), or in preceding and the same region
+### (catalogend)
+unifiedSelectFmt = """
+SELECT tyc2index.%(other)s+tyc2%(cos)s_%(suffix)s.offset%(columns)s
+FROM tyc2index
+INNER JOIN tyc2%(cos)s_%(suffix)s
+   ON tyc2%(cos)s_%(suffix)s.offset BETWEEN tyc2index.%(cos)sstart AND tyc2index.%(cos)send-1"""
+unifiedColumns = dict(uvs=' ,%(source)d ,tyc2%(cos)s_uvs.offset ,x ,y ,z ,mag', pm=' ,pmra ,pmde')
+unifiedOthers = dict(catalog='suppl1start', suppl1='catalogend')
+
+def createUnified(cu):
+  """Write unified TABLEs from tyc2index, tyc2X_uvs and tyc2X_pm; in SQL
+only, so sqlite3ghost can write them
+
+"""
+  for table in unifiedTables: createTable(cu,table)
+  cu.execute("""INSERT INTO tyc2allindex SELECT offset,catalogstart+suppl1start,catalogend+suppl1end FROM tyc2index""")
+  for suffix in ('uvs','pm',):
+    selects = list()
+    for source,cos in enumerate('catalog suppl1'.split()):
+      dikt = dict(cos=cos,source=source,suffix=suffix,other=unifiedOthers[cos])
+      dikt['columns'] = unifiedColumns[suffix] % dikt
+      selects.append(unifiedSelectFmt % dikt)
+    sql = """INSERT INTO tyc2all_%s%s\nUNION ALL%s\nORDER BY 1""" % (suffix,selects[0],selects[1],)
+    sys.stderr.write( "%s\n" % (sql,) )
+    cu.execute(sql)
+  cu.execute("""CREATE INDEX IF NOT EXISTS all_mag ON tyc2all_uvs (mag)""")
+  cu.execute("""INSERT INTO tyc2pmmax SELECT 'all',max(pmmax) FROM tyc2pmmax""")
+
+
+########################################################################
+def migrate(cn):
+  """Convert, in place, tables of DB connection cn to schemaVersion
+
+Copies each TABLE keyed by offset to a new TABLE in offset order, drops
+the old TABLE and its INDEXes, renames the new TABLE, re-creates the
+magnitude INDEXes, and VACUUMs the DB to release the freed pages
+
+"""
+  cu = cn.cursor()
+  cu.execute("""PRAGMA user_version""")
+  version = cu.fetchall()[0][0]
+  if version >= schemaVersion:
+    sys.stderr.write( 'Schema version is already %d\n' % (version,) )
+    return
+
+  cu.execute("""SELECT name FROM sqlite_master WHERE type='table'""")
+  tables = set([row[0] for row in cu.fetchall()])
+  cu.execute("""BEGIN TRANSACTION""")
+  for table in sorted(tables.intersection(tableColumns)):
+    sys.stderr.write( 'Migrating %s\n' % (table,) )
+    createTable(cu,table,'_migrate')
+    cu.execute("""INSERT INTO %s_migrate SELECT * FROM %s ORDER BY offset""" % (table,table,))
+    cu.execute("""DROP TABLE %s""" % (table,))
+    cu.execute("""ALTER TABLE %s_migrate RENAME TO %s""" % (table,table,))
+  createMagIndexes(cu)
+  cu.execute("""PRAGMA user_version = %d""" % (schemaVersion,))
+  cn.commit()
+  cu.execute("""VACUUM""")
+
+  ### Proper motion and Tycho identifier TABLEs cannot be migrated
+  for kind,tables,uses in (('proper motion',pmTables,'epoch queries need',)
+                          ,('Tycho identifier',tycTables,'resolve needs',)
+                          ):
+    missing = missingTables(cn,tables)
+    if missing:
+      sys.stderr.write( 'No %s TABLEs (%s); %s tyc2_loadindex.py reload\n' % (kind,' '.join(missing),uses,) )
+
+
+########################################################################
+### Radian per degree conversion factor
+rpd = math.pi / 180.0
+
+### Rows from IterCat, PoolCat and NumpyCat are
+### (offset,X,Y,Z,mag,pmRA,pmDE,tycid); proper motions are in mas/yr,
+### with pmRA including the cos(DEC) factor, and zero where blank; tycid
+### is from tycId.  These split a row into rows for tyc2X_uvs, tyc2X_pm
+### and tyc2X_tyc
+uvsRow = operator.itemgetter(0,1,2,3,4)
+pmRow = operator.itemgetter(0,5,6)
+tycRow = operator.itemgetter(7,0)
+
+### nameplus string values, one for main catalog and one for supplemental 1 catalog:
+### - tableID,BVFlagColumn,BMagColStart,BMagColEnd,VMagColStart,VMagColEnd
+### - tableID is key into dikt to get catalog filename
+### - BVFlag only used in suppl_1.dat; set column to X for supplemental_1 catalog
+namePluses = 'suppl1,X,83,89,96,102 catalog,81,110,116,123,129'.split()
+
+### All fields of catalog.dat and suppl_1.dat lines, per the separators
+### in catalog.hdr and suppl_1.hdr and the names in the CDS ReadMe:
+### (name, zero-based first column, end column, type); type is 'f'
+### (float, NaN where blank), 'i' (integer, 0 where blank) or 's'
+def fieldList(spec):
+  """List of (name,lo,hi,type) from 'name,lo,hi,type ...' string"""
+  return [(name,int(lo),int(hi),typ,) for name,lo,hi,typ in [tok.split(',') for tok in spec.split()]]
+
+lineFields = dict(
+  catalog=fieldList("""TYC1,0,4,i TYC2,5,10,i TYC3,11,12,i pflag,13,14,s
+                       RAmdeg,15,27,f DEmdeg,28,40,f pmRA,41,48,f pmDE,49,56,f
+                       e_RAmdeg,57,60,f e_DEmdeg,61,64,f e_pmRA,65,69,f e_pmDE,70,74,f
+                       EpRAm,75,82,f EpDEm,83,90,f Num,91,93,i
+                       q_RAmdeg,94,97,f q_DEmdeg,98,101,f q_pmRA,102,105,f q_pmDE,106,109,f
+                       BTmag,110,116,f e_BTmag,117,122,f VTmag,123,129,f e_VTmag,130,135,f
+                       prox,136,139,i TYC,140,141,s HIP,142,148,i CCDM,148,151,s
+                       RAdeg,152,164,f DEdeg,165,177,f EpRA1990,178,182,f EpDE1990,183,187,f
+                       e_RAdeg,188,193,f e_DEdeg,194,199,f posflg,200,201,s corr,202,206,f""")
+, suppl1=fieldList("""TYC1,0,4,i TYC2,5,10,i TYC3,11,12,i flag,13,14,s
+                      RAdeg,15,27,f DEdeg,28,40,f pmRA,41,48,f pmDE,49,56,f
+                      e_RAdeg,57,62,f e_DEdeg,63,68,f e_pmRA,69,74,f e_pmDE,75,80,f
+                      mflag,81,82,s BTmag,83,89,f e_BTmag,90,95,f VTmag,96,102,f e_VTmag,103,108,f
+                      prox,109,112,i TYC,113,114,s HIP,115,121,i CCDM,121,122,s""")
+)
+
+
+########################################################################
+### Heavy DB (option heavy):  TABLEs tyc2X_heavy, offset INTEGER PRIMARY
+### KEY plus one column per lineFields entry; blank fields are NULL
+heavyTypes = dict(f='double', i='int', s='text')
+
+def heavyPath(sqlite3db):
+  """Path of heavy DB beside sqlite3db, e.g. tyc2_heavy.sqlite3"""
+  if sqlite3db.endswith('.sqlite3'): return '%s_heavy.sqlite3' % (sqlite3db[:-8],)
+  return '%s_heavy' % (sqlite3db,)
+
+def heavyColumns(tableid):
+  """Column definitions of TABLE tyc2X_heavy for tableid X"""
+  return ', '.join(['offset INTEGER PRIMARY KEY']
+                   +['%s %s' % (name,heavyTypes[typ],) for name,lo,hi,typ in lineFields[tableid]]
+                  )
+
+def heavyRow(offset, line, fields):
+  """Row of tyc2X_heavy from one line, per fields from lineFields"""
+  row = [offset]
+  for name,lo,hi,typ in fields:
+    value = line[lo:hi].strip()
+    if not value    : row.append(None)
+    elif typ == 'f' : row.append(float(value))
+    elif typ == 'i' : row.append(int(value))
+    else            : row.append(value)
+  return row
+
+
+########################################################################
+### For each line (star) in main and supplemental_1 catalogs, parse
+### zero-based columns here per one-based columns in ReadMe.  INSERT into
+### table the line ### offset (key), XYZ components of RA,DEC unit vector,
+### and magnitude
+
+class IterCat:
+
+  def __init__(self, openfile, ngtoks, firstLine=0, nLines=None):
+
+    self.openfile = openfile
+
+    ### Get columns in line containing B- and V-Magnitude values
+    self.blo,self.bhi,self.vlo,self.vhi = [int(i) for i in ngtoks[2:]]
+
+    ### Get bvflag, and whether this is catalog.dat or other (suppl_1.dat)
+    if ngtoks[1]!='X':
+      self.bvflag = int(ngtoks[1])
+    else:
+      self.bvflag = 0
+    self.isCatalog = ngtoks[0][0] == 'c'
+
+    ### Offset of first line read is firstLine; openfile must already be
+    ### positioned there.  Stop after nLines lines, if specified
+    self.offset = firstLine - 1
+    if nLines is None: self.lastOffset = None
+    else             : self.lastOffset = self.offset + nLines
+
+    self.sql = """INSERT INTO tyc2%s_uvs VALUES (?,?,?,?,?)""" % (ngtoks[0],)
+
+  def __iter__(self): return self
+  def getSelectStatement(self): return self.sql
+  def getOffset(self): return self.offset
+
+  def batches(self, batchSize=200000):
+    """Yield lists of (offset,X,Y,Z,mag,pmRA,pmDE,tycid) tuples"""
+    while True:
+      batch = list(itertools.islice(self,batchSize))
+      if batch: yield batch
+      if len(batch) < batchSize: break
+
+  def next(self): return self.__next__()
+  def __next__(self):
+
+    ### Read one line from catalog file; offset is relative to first line
+
+    while self.offset != self.lastOffset:
+
+      line = self.openfile.readline()
+
+      if not line: break
+
+      self.offset += 1
+      if (self.offset % 100000) == 99999: sys.stderr.write('.') ; sys.stderr.flush()
+
+      ### Skip catalog.dat lines with X in Column 13
+      ### - suppl_1.dat has H or T in Column 13
+      if self.isCatalog and line[13]=='X':
+        radecCols = list(range(152,177,13))
+      else:
+        radecCols = list(range(15,40,13))
+
+      ### Parse RA,DEC, BMag, VMag fields
+      ra,dec = [rpd*float(line[i:i+12]) for i in radecCols]
+      btok,vtok = [line[lo:hi].strip() for lo,hi in ((self.blo,self.bhi,),(self.vlo,self.vhi,),)]
+
+      ### Parse magnitude per bvflag and/or B/V mag values
+      mag = 0.0
+      if self.bvflag>0:
+        try:
+          if line[self.bvflag]==' ' or line[self.bvflag]=='B': mag = float(btok)
+        except:
+          pass
+        if mag==0.0 and vtok: mag = float(vtok)
+      else:
+        if btok:  mag = float(btok)
+        if mag==0.0 and vtok: mag = float(vtok)
+
+      ### Reset zero magnitude to 20.0
+      if mag==0.0: mag=20.0
+
+      ### Parse proper motions; blank (e.g. no mean position) is zero
+      pms = [line[lo:lo+7].strip() for lo in (41,49,)]
+      pmra,pmde = [pm and float(pm) or 0.0 for pm in pms]
+
+      ### Parse TYC1, TYC2, TYC3
+      tycid = tycId(int(line[0:4]),int(line[5:10]),int(line[11]))
+
+      ### Convert RA,DEC to unit vector
+      ### Build record of offset,unit vector XYZ components, magnitude
+      ### INSERT data
+      cosra, sinra, cosdec, sindec = math.cos(ra), math.sin(ra), math.cos(dec), math.sin(dec)
+      return (self.offset, cosra*cosdec, sinra*cosdec, sindec, mag, pmra, pmde, tycid)
+
+    self.openfile.close()
+    raise StopIteration
+
+
+########################################################################
+def starRtreeRow(row):
+  """Convert (offset,X,Y,Z,mag,...) row to per-star R-Tree row
+(offset,lora,hira,lodec,hidec,lomag,himag), RA and DEC in degrees
+
+"""
+  offset,x,y,z,mag = row[:5]
+  ra = (math.atan2(y,x) / rpd) % 360.0
+  dec = math.asin(max(-1.0,min(1.0,z))) / rpd
+  return (offset,ra,ra,dec,dec,mag,mag,)
+
+
+########################################################################
+def getShards(path, nShards):
+  """Split fixed-width catalog file into line-aligned ranges
+
+Return list of (firstLine, nLines,) pairs, in line order, covering all
+lines of the file
+
+"""
+  nLinesAll = os.path.getsize(path) // getLineLength(path)
+  nShards = max(1,min(nShards,nLinesAll))
+  bounds = [(nLinesAll * i) // nShards for i in range(nShards+1)]
+  return [(lo,hi-lo,) for lo,hi in zip(bounds[:-1],bounds[1:]) if hi>lo]
+
+
+########################################################################
+def parseShard(args):
+  """Process pool worker:  parse one line-aligned range of catalog.dat
+or suppl_1.dat with IterCat, or with NumpyCat if useNumpy is True
+
+Argument is tuple (path, ngtoks, firstLine, nLines, useNumpy,)
+
+Return list of (offset,X,Y,Z,mag,pmRA,pmDE,tycid) tuples
+
+"""
+  path,ngtoks,firstLine,nLines,useNumpy = args
+  if useNumpy:
+    return [row for batch in NumpyCat(path,ngtoks,firstLine,nLines).batches() for row in batch]
+  f = open(path,'r')
+  f.seek(firstLine * getLineLength(path))
+  return list(IterCat(f,ngtoks,firstLine,nLines))
+
+
+########################################################################
+class PoolCat:
+  """
+Parse catalog.dat or suppl_1.dat as line-aligned ranges in a process
+pool, via parseShard above
+
+Constructor:  PoolCat(pool, path, ngtoks, jobs, useNumpy)
+
+  pool:  multiprocessing.Pool instance
+  jobs:  number of processes in pool; file is split into 4*jobs ranges
+
+Methods:  getSelectStatement; getOffset; batches.
+
+"""
+
+  def __init__(self, pool, path, ngtoks, jobs, useNumpy):
+    self.pool = pool
+    self.shardArgs = [(path,ngtoks,firstLine,nLines,useNumpy,)
+                      for firstLine,nLines in getShards(path,jobs*4)
+                     ]
+    self.offset = -1
+    self.sql = """INSERT INTO tyc2%s_uvs VALUES (?,?,?,?,?)""" % (ngtoks[0],)
+
+  def getSelectStatement(self): return self.sql
+  def getOffset(self): return self.offset
+
+  def batches(self):
+    """Yield one list of (offset,X,Y,Z,mag,pmRA,pmDE,tycid) tuples per range; .imap
+returns results in range order, so rows are yielded in offset order
+
+"""
+    for batch in self.pool.imap(parseShard,self.shardArgs):
+      if batch: self.offset = batch[-1][0]
+      yield batch
+
+
+########################################################################
+class NumpyCat:
+  """
+Parse all lines of catalog.dat or of suppl_1.dat at once, as columns of
+NumPy arrays over a memory-mapped file; same column positions and
+magnitude rules as class IterCat above
+
+Constructor:  NumpyCat(path, ngtoks[, firstLine[, nLines]])
+
+  path:  catalog.dat or suppl_1.dat
+  ngtoks:  nameplus tokens, as passed to IterCat
+  firstLine, nLines:  optional range of lines to parse; default is all
+
+Methods:  getSelectStatement; getOffset; batches; columns.
+
+"""
+
+  def __init__(self, path, ngtoks, firstLine=0, nLines=None):
+
+    self.path,self.firstLine,self.nLines = path,firstLine,nLines
+
+    ### Get columns in line containing B- and V-Magnitude values
+    self.blo,self.bhi,self.vlo,self.vhi = [int(i) for i in ngtoks[2:]]
+
+    ### Get bvflag, and whether this is catalog.dat or other (suppl_1.dat)
+    if ngtoks[1]!='X':
+      self.bvflag = int(ngtoks[1])
+    else:
+      self.bvflag = 0
+    self.isCatalog = ngtoks[0][0] == 'c'
+
+    self.offset = -1
+
+    self.sql = """INSERT INTO tyc2%s_uvs VALUES (?,?,?,?,?)""" % (ngtoks[0],)
+
+  def getSelectStatement(self): return self.sql
+  def getOffset(self): return self.offset
+
+  def lines(self):
+    """Memory-map file as 2-D array of bytes, one row per line"""
+    import numpy
+    lineLength = getLineLength(self.path)
+    nLines,partial = divmod(os.path.getsize(self.path),lineLength)
+    assert 0 == partial, '%s is not fixed-width' % (self.path,)
+    lines = numpy.memmap(self.path,dtype=numpy.uint8,mode='r',shape=(nLines,lineLength,))
+    if self.nLines is None: return lines[self.firstLine:]
+    return lines[self.firstLine:self.firstLine+self.nLines]
+
+  def columns(self):
+    """Return offsets, X, Y, Z, magnitude, pmRA, pmDE, tycid arrays"""
+    import numpy
+
+    lines = self.lines()
+
+    def field(lo,hi):
+      """Parse one fixed-width field of all lines; blank fields are 0.0"""
+      chars = numpy.ascontiguousarray(lines[:,lo:hi])
+      blank = (chars==32).all(axis=1)
+      chars[blank,-1] = ord('0')
+      return chars.view('S%d' % (hi-lo,)).ravel().astype(numpy.float64)
+
+    ### Use observed RA,DEC for catalog.dat lines with X in Column 13
+    ### - suppl_1.dat has H or T in Column 13
+    rpd = math.pi / 180.0
+    ra,dec = [rpd*field(i,i+12) for i in range(15,40,13)]
+    if self.isCatalog:
+      observed = lines[:,13] == ord('X')
+      if observed.any():
+        ra[observed],dec[observed] = [rpd*field(i,i+12)[observed] for i in range(152,177,13)]
+
+    ### Magnitude per bvflag and/or B/V mag values, zero reset to 20.0
+    bmag,vmag = field(self.blo,self.bhi),field(self.vlo,self.vhi)
+    if self.bvflag>0:
+      useB = (lines[:,self.bvflag]==ord(' ')) | (lines[:,self.bvflag]==ord('B'))
+      mag = numpy.where(useB,bmag,0.0)
+    else:
+      mag = bmag
+    mag = numpy.where(mag==0.0,vmag,mag)
+    mag[mag==0.0] = 20.0
+
+    ### Convert RA,DEC to unit vector
+    cosdec = numpy.cos(dec)
+    offsets = numpy.arange(self.firstLine,self.firstLine+len(lines))
+    self.offset = self.firstLine + len(lines) - 1
+    return (offsets, numpy.cos(ra)*cosdec, numpy.sin(ra)*cosdec, numpy.sin(dec), mag
+           ,field(41,48), field(49,56)
+           ,tycId(field(0,4),field(5,10),field(11,12)).astype(numpy.int64)
+           )
+
+  def batches(self, batchSize=200000):
+    """Yield lists of (offset,X,Y,Z,mag,pmRA,pmDE,tycid) tuples"""
+    columns = self.columns()
+    for lo in range(0,len(columns[0]),batchSize):
+      yield list(zip(*[column[lo:lo+batchSize].tolist() for column in columns]))
+
 
 if __name__ == "__main__":
-  import os
-  import sys
-  import math
   try:
     import sqlite3 as sl3
   except:
@@ -65,6 +713,15 @@ if __name__ == "__main__":
   filekeys = 'index catalog suppl1 sqlite3db'.split()
 
   dikt = dict( reload=False
+             , numpy=False
+             , jobs='1'
+             , gzdir=''
+             , starrtree=False
+             , magsort=False
+             , unified=False
+             , limit=''
+             , heavy=False
+             , migrate=False
              , test=False
              , testplot=False
              , loadallpaths=False
@@ -103,6 +760,9 @@ if __name__ == "__main__":
         else:
           assert os.access(realpath,os.R_OK)
       except:
+        ### With --gzdir, data files are streamed from .gz pieces
+        if dikt['gzdir'] and key != 'sqlite3db' and not os.path.exists(realpath):
+          continue
         if key == 'sqlite3db':
           if not os.path.exists(realpath):
             try:
@@ -145,14 +805,29 @@ if __name__ == "__main__":
     cu.execute("""DROP TABLE IF EXISTS tyc2indexrtree""")
     cu.execute("""DROP TABLE IF EXISTS tyc2index""")
     cu.execute("""CREATE VIRTUAL TABLE tyc2indexrtree using rtree(offset,lora,hira,lodec,hidec)""")
-    cu.execute("""CREATE TABLE IF NOT EXISTS tyc2index (offset int primary key,catalogstart int, suppl1start int, catalogend int, suppl1end int)""")
+    createTable(cu,'tyc2index')
+    cu.execute("""PRAGMA user_version = %d""" % (schemaVersion,))
 
-    ### DROP and CREATE catalog TABLEs
+    ### DROP and CREATE catalog and proper motion TABLEs
+    cu.execute("""DROP TABLE IF EXISTS tyc2pmmax""")
+    cu.execute("""CREATE TABLE tyc2pmmax (%s)""" % (pmMaxColumns,))
     for tableid in 'catalog suppl1'.split():
-      table = ("""tyc2%s_uvs""" % (tableid,),)
-      cu.execute("""DROP TABLE IF EXISTS %s""" % table)
-      cu.execute("""CREATE TABLE IF NOT EXISTS %s (offset int primary key,x double, y double, z double,mag double)""" % table)
-      cu.execute("""DELETE FROM %s""" % table)
+      for table in [("""tyc2%s_%s""" % (tableid,suffix,),) for suffix in ('uvs','pm',)]:
+        cu.execute("""DROP TABLE IF EXISTS %s""" % table)
+        createTable(cu,table[0])
+        cu.execute("""DELETE FROM %s""" % table)
+      cu.execute("""DROP TABLE IF EXISTS tyc2%s_tyc""" % (tableid,))
+      cu.execute("""CREATE TABLE tyc2%s_tyc (%s)""" % (tableid,tycColumns,))
+      ### Per-star R-Tree is dropped either way, so it is never stale
+      starrtree = ("""tyc2%s_starrtree""" % (tableid,),)
+      cu.execute("""DROP TABLE IF EXISTS %s""" % starrtree)
+      if dikt['starrtree']:
+        cu.execute("""CREATE VIRTUAL TABLE %s using rtree(offset,lora,hira,lodec,hidec,lomag,himag)""" % starrtree)
+      ### Likewise magnitude-sorted TABLEs; CREATEd after loading
+      cu.execute("""DROP TABLE IF EXISTS tyc2%s_magsorted""" % (tableid,))
+      cu.execute("""DROP TABLE IF EXISTS tyc2%s_magbreaks""" % (tableid,))
+    ### Likewise unified TABLEs
+    for table in unifiedTables: cu.execute("""DROP TABLE IF EXISTS %s""" % (table,))
 
     cu.execute("""DELETE FROM tyc2indexrtree""")
     cu.execute("""DELETE FROM tyc2index""")
@@ -160,7 +835,7 @@ if __name__ == "__main__":
 
     ### Open index.dat and read first line
     offset = 0
-    f = open(dikt['index'],'r')
+    f = openLines(dikt['index'],'index',dikt['gzdir'])
     nexttoks = [i.strip() for i in f.readline().split('|')]
     rows = [int(i)-1 for i in nexttoks[:2]]
 
@@ -186,106 +861,45 @@ if __name__ == "__main__":
 
     cn.commit()
 
-    ### Radian per degree conversion factor
-    rpd = math.pi / 180.0
-
-    ### For each line (star) in main and supplemental_1 catalogs, parse
-    ### zero-based columns here per one-based columns in ReadMe.  INSERT into
-    ### table the line ### offset (key), XYZ components of RA,DEC unit vector,
-    ### and magnitude
-
-    class IterCat:
-
-      def __init__(self, openfile, ngtoks):
-
-        self.openfile = openfile
-
-        ### Get columns in line containing B- and V-Magnitude values
-        self.blo,self.bhi,self.vlo,self.vhi = [int(i) for i in ngtoks[2:]]
-
-        ### Get bvflag, and whether this is catalog.dat or other (suppl_1.dat)
-        if ngtoks[1]!='X':
-          self.bvflag = int(ngtoks[1])
-        else:
-          self.bvflag = 0
-        self.isCatalog = ngtoks[0][0] == 'c'
-
-        self.offset = -1
-
-        self.sql = """INSERT INTO tyc2%s_uvs VALUES (?,?,?,?,?)""" % (ngtoks[0],)
-
-      def __iter__(self): return self
-      def getSelectStatement(self): return self.sql
-      def getOffset(self): return self.offset
-
-      def next(self): return self.__next__()
-      def __next__(self):
-
-        ### Read one line from catalog file; offset is relative to first line
-
-        while True:
-
-          line = self.openfile.readline()
-
-          if not line: break
-
-          self.offset += 1
-          if (self.offset % 100000) == 99999: sys.stderr.write('.') ; sys.stderr.flush()
-
-          ### Skip catalog.dat lines with X in Column 13
-          ### - suppl_1.dat has H or T in Column 13
-          if self.isCatalog and line[13]=='X':
-            radecCols = list(range(152,177,13))
-          else:
-            radecCols = list(range(15,40,13))
-
-          ### Parse RA,DEC, BMag, VMag fields
-          ra,dec = [rpd*float(line[i:i+12]) for i in radecCols]
-          btok,vtok = [line[lo:hi].strip() for lo,hi in ((self.blo,self.bhi,),(self.vlo,self.vhi,),)]
-
-          ### Parse magnitude per bvflag and/or B/V mag values
-          mag = 0.0
-          if self.bvflag>0:
-            try:
-              if line[self.bvflag]==' ' or line[self.bvflag]=='B': mag = float(btok)
-            except:
-              pass
-            if mag==0.0 and vtok: mag = float(vtok)
-          else:
-            if btok:  mag = float(btok)
-            if mag==0.0 and vtok: mag = float(vtok)
-
-          ### Reset zero magnitude to 20.0
-          if mag==0.0: mag=20.0
+    ### Start pool of parsing processes for --jobs=N
+    jobs = int(dikt['jobs'])
+    if dikt['gzdir'] and (jobs > 1 or dikt['numpy']):
+      sys.stderr.write( "Ignoring numpy and --jobs with --gzdir\n" )
+      jobs,dikt['numpy'] = 1,False
+    if jobs > 1:
+      import multiprocessing
+      pool = multiprocessing.Pool(jobs)
 
-          ### Convert RA,DEC to unit vector
-          ### Build record of offset,unit vector XYZ components, magnitude
-          ### INSERT data
-          cosra, sinra, cosdec, sindec = math.cos(ra), math.sin(ra), math.cos(dec), math.sin(dec)
-          return (self.offset, cosra*cosdec, sinra*cosdec, sindec, mag)
-
-        self.openfile.close()
-        raise StopIteration
-
-
-    for nameplus in 'suppl1,X,83,89,96,102 catalog,81,110,116,123,129'.split():
-      ### nameplus string values, one for main catalog and one for supplemental 1 catalog:
-      ### - tableID,BVFlagColumn,BMagColStart,BMagColEnd,VMagColStart,VMagColEnd
-      ### - tableID is key into dikt to get catalog filename
-      ### - BVFlag only used in suppl_1.dat; set column to X for supplemental_1 catalog
+    for nameplus in namePluses:
 
       ngtoks = nameplus.split(',')
 
       ### Build insert command (table ID is ngtoks[0])
 
-      reciter = IterCat(open(dikt[ngtoks[0]],'r'),ngtoks)
+      if jobs > 1:
+        reciter = PoolCat(pool,dikt[ngtoks[0]],ngtoks,jobs,dikt['numpy'])
+      elif dikt['numpy']:
+        reciter = NumpyCat(dikt[ngtoks[0]],ngtoks)
+      else:
+        reciter = IterCat(openLines(dikt[ngtoks[0]],ngtoks[0],dikt['gzdir']),ngtoks)
 
       sql = reciter.getSelectStatement()
+      sqlPm = """INSERT INTO tyc2%s_pm VALUES (?,?,?)""" % (ngtoks[0],)
+      sqlTyc = """INSERT INTO tyc2%s_tyc VALUES (?,?)""" % (ngtoks[0],)
+      sqlStarRtree = """INSERT INTO tyc2%s_starrtree VALUES (?,?,?,?,?,?,?)""" % (ngtoks[0],)
 
-      sys.stderr.write( "%s\n" % (sql,) )
+      sys.stderr.write( "%s\n%s\n%s\n" % (sql,sqlPm,sqlTyc,) )
+      if dikt['starrtree']: sys.stderr.write( "%s\n" % (sqlStarRtree,) )
 
       cu.execute("""BEGIN TRANSACTION""")
-      cu.executemany(sql,reciter)
+      for batch in reciter.batches():
+        cu.executemany(sql,map(uvsRow,batch))
+        cu.executemany(sqlPm,map(pmRow,batch))
+        cu.executemany(sqlTyc,map(tycRow,batch))
+        if dikt['starrtree']: cu.executemany(sqlStarRtree,map(starRtreeRow,batch))
+      ### Upper limit of total proper motion, to grow query boxes for
+      ### epochs; in SQL only, so sqlite3ghost can write it
+      cu.execute("""INSERT INTO tyc2pmmax SELECT ?,max(abs(pmra)+abs(pmde)) FROM tyc2%s_pm""" % (ngtoks[0],),(ngtoks[0],))
       cn.commit()
 
       offset = reciter.getOffset()
@@ -299,17 +913,71 @@ if __name__ == "__main__":
       sys.stderr.write('%s%d records written for %s\n'%(nlopt,offset,nameplus,)),
       sys.stderr.flush()
 
+    if jobs > 1:
+      pool.close()
+      pool.join()
+
+    ### Write magnitude-sorted TABLEs for option magsort; these are built
+    ### from the loaded TABLEs, which sqlite3ghost cannot read back
+    if dikt['magsort'] and getattr(sl3,'isGhost',False):
+      sys.stderr.write( "Ignoring magsort with sqlite3ghost\n" )
+    elif dikt['magsort']:
+      cu.execute("""BEGIN TRANSACTION""")
+      for tableid in 'catalog suppl1'.split(): createMagSorted(cu,tableid)
+      cn.commit()
+
+    ### Write unified TABLEs for option unified
+    if dikt['unified']:
+      cu.execute("""BEGIN TRANSACTION""")
+      createUnified(cu)
+      cn.commit()
+
     ### Create INDEX for each magnitude
-    for tableid in 'catalog suppl1'.split():
-      table = """tyc2%s_uvs""" % (tableid,)
-      s ="""CREATE INDEX IF NOT EXISTS %(tableid)s_mag ON %(table)s (mag)""" % dict(tableid=tableid,table=table)
-      sys.stderr.write( "%s\n" % (s,) )
-      cu.execute(s)
+    createMagIndexes(cu)
 
     ### Close DB connection
     cn.close()
 
 
+  ######################################################################
+  ### Option migrate:  convert existing SQLite DB to current schema
+  if dikt['migrate'] and not dikt['reload']:
+    cn = sl3.connect(dikt['sqlite3db'])
+    migrate(cn)
+    cn.close()
+
+
+  ######################################################################
+  ### Option heavy:  Load all fields into heavy DB, keyed by offset
+  if dikt['heavy'] and getattr(sl3,'isGhost',False):
+    sys.stderr.write( "Ignoring heavy with sqlite3ghost\n" )
+  elif dikt['heavy']:
+    cn = sl3.connect(heavyPath(dikt['sqlite3db']))
+    cu = cn.cursor()
+
+    cu.execute("""PRAGMA synchronous = OFF""")
+    cu.execute("""PRAGMA journal_mode = MEMORY""")
+
+    for tableid in 'catalog suppl1'.split():
+      fields = lineFields[tableid]
+      cu.execute("""DROP TABLE IF EXISTS tyc2%s_heavy""" % (tableid,))
+      cu.execute("""CREATE TABLE tyc2%s_heavy (%s)""" % (tableid,heavyColumns(tableid),))
+      sql = """INSERT INTO tyc2%s_heavy VALUES (%s)""" % (tableid,','.join('?'*(len(fields)+1)),)
+      sys.stderr.write( "%s\n" % (sql,) )
+
+      lines = openLines(dikt[tableid],tableid,dikt['gzdir'])
+      rows = (heavyRow(offset,line,fields) for offset,line in enumerate(lines))
+      cu.execute("""BEGIN TRANSACTION""")
+      while True:
+        batch = list(itertools.islice(rows,200000))
+        if not batch: break
+        cu.executemany(sql,batch)
+      cn.commit()
+      lines.close()
+
+    cn.close()
+
+
   ######################################################################
   ### Option test:  list all *possible* stars from 56<RA<58, 23<DEC<25, mag<6.5 (Pleiades)
   if dikt['test'] or dikt['testplot']:
@@ -326,21 +994,63 @@ if __name__ == "__main__":
         i += 1
 
     import math
+    import time
+    import heapq
+    import skybox
+    limit = dikt['limit'] and int(dikt['limit']) or None
     dpr = 180.0 / math.pi
     print("C|S Offset      X      Y      Z   Magn.")
     cn = sl3.connect(dikt['sqlite3db'])
     cu = cn.cursor()
 
     for catORsp1 in "catalog suppl1".split():
-      cu.execute("""
+      t0 = time.time()
+      if dikt['starrtree']:
+        ### Per-star R-Tree; ?1 is himag, ?2 through ?5 are RA,DEC limits
+        sql = """
+SELECT tyc2%(cos)s_uvs.offset
+      ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag
+FROM tyc2%(cos)s_starrtree
+INNER JOIN tyc2%(cos)s_uvs
+   ON tyc2%(cos)s_starrtree.offset=tyc2%(cos)s_uvs.offset
+  AND tyc2%(cos)s_uvs.mag<?1
+WHERE tyc2%(cos)s_starrtree.lomag<?1
+  AND tyc2%(cos)s_starrtree.hira>?2
+  AND tyc2%(cos)s_starrtree.lora<?3
+  AND tyc2%(cos)s_starrtree.hidec>?4
+  AND tyc2%(cos)s_starrtree.lodec<?5
+ORDER BY tyc2%(cos)s_uvs.mag asc;
+  """ % dict(cos=catORsp1)
+      elif dikt['magsort']:
+        ### Magnitude-sorted regions; ?1 is himag, ?2 through ?5 are RA,DEC
+        ### limits, ?6 is magBin(himag); yields seq range of each region
+        sql = """
+SELECT tyc2%(cos)s_magbreaks.seqstart ,tyc2%(cos)s_magbreaks.seqend
+FROM tyc2indexrtree
+INNER JOIN tyc2%(cos)s_magbreaks
+   ON tyc2%(cos)s_magbreaks.region=tyc2indexrtree.offset
+  AND tyc2%(cos)s_magbreaks.mag=?6
+WHERE tyc2indexrtree.hira>?2
+  AND tyc2indexrtree.lora<?3
+  AND tyc2indexrtree.hidec>?4
+  AND tyc2indexrtree.lodec<?5;
+  """ % dict(cos=catORsp1)
+        sqlRun = """
+SELECT offset ,x ,y ,z ,mag
+FROM tyc2%(cos)s_magsorted
+WHERE seq BETWEEN ?1 AND ?2-1
+  AND mag<?3
+ORDER BY seq;
+  """ % dict(cos=catORsp1)
+      else:
+        sql = """
 SELECT tyc2%(cos)s_uvs.offset
       ,tyc2%(cos)s_uvs.x ,tyc2%(cos)s_uvs.y ,tyc2%(cos)s_uvs.z ,tyc2%(cos)s_uvs.mag
 FROM tyc2indexrtree
 INNER JOIN tyc2index
    ON tyc2indexrtree.offset=tyc2index.offset
 INNER JOIN tyc2%(cos)s_uvs
-   ON tyc2index.%(cos)sstart<=tyc2%(cos)s_uvs.offset
-  AND tyc2index.%(cos)send>tyc2%(cos)s_uvs.offset
+   ON tyc2%(cos)s_uvs.offset BETWEEN tyc2index.%(cos)sstart AND tyc2index.%(cos)send-1
   AND tyc2%(cos)s_uvs.mag<?
 WHERE tyc2indexrtree.offset=tyc2index.offset
   AND tyc2indexrtree.hira>?
@@ -348,12 +1058,39 @@ WHERE tyc2indexrtree.offset=tyc2index.offset
   AND tyc2indexrtree.hidec>?
   AND tyc2indexrtree.lodec<?
 ORDER BY tyc2%(cos)s_uvs.mag asc;
-  """ % dict(cos=catORsp1), arg5)
+  """ % dict(cos=catORsp1)
+
+      ### Split box that crosses RA=0/360 (e.g. --lora=350 --hira=10)
+      boxes = skybox.radecBoxes(*arg5[1:])
+      if dikt['starrtree'] or not dikt['magsort']:
+        fetched = list()
+        for box in boxes:
+          cu.execute(sql, arg5[:1]+list(box))
+          fetched.extend(cu.fetchall())
+        if len(boxes) > 1:
+          ### Boxes may share index.dat regions:  remove duplicate stars,
+          ### then restore magnitude order
+          fetched = sorted(dict([(row[0],row) for row in fetched]).values(), key=lambda row:row[4])
+        fetched = fetched[:limit]
+      else:
+        ### Distinct seq ranges of all regions in all boxes
+        runs = set()
+        for box in boxes:
+          cu.execute(sql, arg5[:1]+list(box)+[magBin(arg5[0])])
+          runs.update(cu.fetchall())
+        ### Merge per-region runs, each already in magnitude order, and
+        ### stop after limit rows, so each run is read only as far as
+        ### needed; [(mag,row)] so ties compare without a key function
+        def runRows(seqstart,seqend):
+          for row in cn.execute(sqlRun,(seqstart,seqend,arg5[0],)): yield (row[4],row,)
+        merged = heapq.merge(*[runRows(*run) for run in sorted(runs)])
+        fetched = [row for mag,row in itertools.islice(merged,limit)]
 
       def recra(row,isTestplot):
         if isTestplot: return (' %7.3f %7.3f' % (dpr*math.atan2(row[2],row[1]), dpr*math.asin(row[3]),),)
         return ('',)
-      rows = [ (catORsp1[0],) + row + recra(row,dikt['testplot']) for row in cu.fetchall()]
+      rows = [ (catORsp1[0],) + row + recra(row,dikt['testplot']) for row in fetched]
+      sys.stderr.write( "%s query:  %d rows in %.6fs\n" % (catORsp1,len(rows),time.time()-t0,) )
       for row in rows: print( "  %s%7d %6.3f %6.3f %6.3f %7.3f%s" % row )
 
       if len(rows) and dikt['testplot']:
@@ -18,13 +18,13 @@ typedef struct TYC2rtnStruct {
   struct TYC2rtnStruct *next;
 } TYC2rtn, *pTYC2rtn, **ppTYC2rtn;
 
-static char* catalogStmt = { "SELECT tyc2catalog_uvs.offset ,tyc2catalog_uvs.x ,tyc2catalog_uvs.y ,tyc2catalog_uvs.z ,tyc2catalog_uvs.mag FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2catalog_uvs ON tyc2index.catalogstart<=tyc2catalog_uvs.offset AND tyc2index.catalogend>tyc2catalog_uvs.offset AND tyc2catalog_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2catalog_uvs.mag asc;" };
+static char* catalogStmt = { "SELECT tyc2catalog_uvs.offset ,tyc2catalog_uvs.x ,tyc2catalog_uvs.y ,tyc2catalog_uvs.z ,tyc2catalog_uvs.mag FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2catalog_uvs ON tyc2catalog_uvs.offset BETWEEN tyc2index.catalogstart AND tyc2index.catalogend-1 AND tyc2catalog_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2catalog_uvs.mag asc;" };
 
-static char* catalogCountStmt = { "SELECT count(0) FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2catalog_uvs ON tyc2index.catalogstart<=tyc2catalog_uvs.offset AND tyc2index.catalogend>tyc2catalog_uvs.offset AND tyc2catalog_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2catalog_uvs.mag asc;" };
+static char* catalogCountStmt = { "SELECT count(0) FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2catalog_uvs ON tyc2catalog_uvs.offset BETWEEN tyc2index.catalogstart AND tyc2index.catalogend-1 AND tyc2catalog_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2catalog_uvs.mag asc;" };
 
-static char* suppl1Stmt = { "SELECT tyc2suppl1_uvs.offset ,tyc2suppl1_uvs.x ,tyc2suppl1_uvs.y ,tyc2suppl1_uvs.z ,tyc2suppl1_uvs.mag FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2suppl1_uvs ON tyc2index.suppl1start<=tyc2suppl1_uvs.offset AND tyc2index.suppl1end>tyc2suppl1_uvs.offset AND tyc2suppl1_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2suppl1_uvs.mag asc;" };
+static char* suppl1Stmt = { "SELECT tyc2suppl1_uvs.offset ,tyc2suppl1_uvs.x ,tyc2suppl1_uvs.y ,tyc2suppl1_uvs.z ,tyc2suppl1_uvs.mag FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2suppl1_uvs ON tyc2suppl1_uvs.offset BETWEEN tyc2index.suppl1start AND tyc2index.suppl1end-1 AND tyc2suppl1_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2suppl1_uvs.mag asc;" };
 
-static char* suppl1CountStmt = { "SELECT count(0) FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2suppl1_uvs ON tyc2index.suppl1start<=tyc2suppl1_uvs.offset AND tyc2index.suppl1end>tyc2suppl1_uvs.offset AND tyc2suppl1_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2suppl1_uvs.mag asc;" };
+static char* suppl1CountStmt = { "SELECT count(0) FROM tyc2indexrtree INNER JOIN tyc2index ON tyc2indexrtree.offset=tyc2index.offset INNER JOIN tyc2suppl1_uvs ON tyc2suppl1_uvs.offset BETWEEN tyc2index.suppl1start AND tyc2index.suppl1end-1 AND tyc2suppl1_uvs.mag<? WHERE tyc2indexrtree.offset=tyc2index.offset AND tyc2indexrtree.hira>? AND tyc2indexrtree.lora<? AND tyc2indexrtree.hidec>? AND tyc2indexrtree.lodec<? ORDER BY tyc2suppl1_uvs.mag asc;" };
 
 static char* pathLookupStmt = { "SELECT fullpath FROM tyc2paths WHERE key=? LIMIT 1;" };
 
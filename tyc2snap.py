@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+"""
+tyc2snap.py - in-memory Tycho-2 query engine over a NumPy snapshot of
+              the TABLEs written by tyc2_loadindex.py
+
+The snapshot is a directory of .npy files, memory-mapped when opened,
+so startup reads no star data; pages are read as queries touch them.
+
+  regions.npy            - per index.dat region:  lora, hira, lodec,
+                           hidec (as stored in tyc2indexrtree, i.e. with
+                           the R-Tree's rounding), catalogstart,
+                           catalogend, suppl1start, suppl1end
+  catalog_xyz.npy, ...   - per source, in offset order:  xyz (float32,
+                           Nx3), mag (float32), pm (pmRA*cos(DEC) and
+                           pmDE, mas/yr, float32, Nx2)
+  pmmax.npy              - upper limit of total proper motion of each
+                           source, as in tyc2pmmax
+
+float32 keeps the 2.5M stars of Tycho-2 at about 70MB; positions are
+good to about 10mas.
+
+Tyc2Snapshot has the same query methods, arguments and results as
+tyc2.Tyc2Catalog (box, iterbox, cone, polygon), including the index.dat
+region semantics of box (all *possible* stars of the regions that meet
+the box), so the two are interchangeable; instead of an R-Tree, the
+index.dat regions, sorted by DEC, are the grid:  the regions that meet
+a box are found by binary search and one vectorized comparison.  It
+adds nearest, the N nearest stars to a vector.
+
+Usage:
+
+  python tyc2snap.py [--sqlite3db=tyc2.sqlite3] \\
+                     [--snapshot=tyc2.snapshot] \\
+                     export
+
+  import tyc2, tyc2snap
+
+  tycho2 = tyc2snap.Tyc2Snapshot('tyc2.snapshot')
+  stars = tycho2.box(6.5, 56.0, 58.0, 23.0, 25.0)
+  stars = tycho2.cone(tyc2.radecToXyz(56.75, 24.12), 1.5, 6.5)
+  stars = tycho2.nearest(tyc2.radecToXyz(56.75, 24.12), 10, 9.0)
+
+Prerequisites:  NumPy; tyc2.py; skybox.py; tyc2.sqlite3 from tyc2_loadindex.py reload
+
+"""
+import os
+import sys
+import math
+import bisect
+import sqlite3
+import numpy
+import skybox
+import tyc2
+
+sources = tyc2.sources
+
+### Region bounds and star ranges, in tyc2index offset order
+regionsSelect = """
+SELECT tyc2indexrtree.lora ,tyc2indexrtree.hira ,tyc2indexrtree.lodec ,tyc2indexrtree.hidec
+      ,tyc2index.catalogstart ,tyc2index.catalogend ,tyc2index.suppl1start ,tyc2index.suppl1end
+FROM tyc2index
+INNER JOIN tyc2indexrtree
+   ON tyc2indexrtree.offset=tyc2index.offset
+ORDER BY tyc2index.offset
+"""
+starsSelectFmt = """
+SELECT tyc2%(cos)s_uvs.offset ,x ,y ,z ,mag ,pmra ,pmde
+FROM tyc2%(cos)s_uvs
+INNER JOIN tyc2%(cos)s_pm
+   ON tyc2%(cos)s_pm.offset=tyc2%(cos)s_uvs.offset
+ORDER BY tyc2%(cos)s_uvs.offset
+"""
+
+### Columns of regions.npy
+LORA,HIRA,LODEC,HIDEC = range(4)
+rangeColumns = dict(catalog=(4,5,), suppl1=(6,7,))
+
+### Square degrees in the sky, to size the first cone of nearest
+skyDegrees = 4.0 * math.pi / (skybox.rpd * skybox.rpd)
+
+### Up to this many regions, gatherRanges concatenates aranges, which is
+### faster for few ranges than the vectorized repeat and cumsum
+smallRanges = 16
+noIndices = numpy.zeros(0,dtype=numpy.int64)
+
+
+########################################################################
+def export(sqlite3db, snapshot):
+  """Write snapshot directory from SQLite DB written by tyc2_loadindex.py"""
+  cn = sqlite3.connect(sqlite3db)
+  missing = tyc2.missingTables(cn,tyc2.pmTables)
+  assert not missing, '%s has no proper motions (%s); run tyc2_loadindex.py reload' % (sqlite3db,' '.join(missing),)
+  if not os.path.isdir(snapshot): os.makedirs(snapshot)
+
+  regions = numpy.array(cn.execute(regionsSelect).fetchall(),dtype=numpy.float64)
+  numpy.save(os.path.join(snapshot,'regions.npy'),regions)
+
+  for source in sources:
+    rows = numpy.array(cn.execute(starsSelectFmt % dict(cos=source)).fetchall(),dtype=numpy.float64).reshape((-1,7,))
+    assert (rows[:,0] == numpy.arange(len(rows))).all(), 'Offsets of %s are not contiguous' % (source,)
+    for name,columns in (('xyz',slice(1,4),),('mag',4,),('pm',slice(5,7),),):
+      numpy.save(os.path.join(snapshot,'%s_%s.npy' % (source,name,)),rows[:,columns].astype(numpy.float32))
+    sys.stderr.write( '%d stars written for %s\n' % (len(rows),source,) )
+
+  pmMax = dict(cn.execute("""SELECT tableid,pmmax FROM tyc2pmmax""").fetchall())
+  numpy.save(os.path.join(snapshot,'pmmax.npy'),numpy.array([pmMax[source] for source in sources]))
+  cn.close()
+
+
+########################################################################
+def gatherRanges(starts, ends):
+  """Concatenation of ranges [starts[i]:ends[i]), as one index array"""
+  if len(starts) <= smallRanges:
+    return numpy.concatenate([numpy.arange(lo,hi) for lo,hi in zip(starts.tolist(),ends.tolist())] or [noIndices])
+  counts = ends - starts
+  firsts = numpy.repeat(numpy.cumsum(counts) - counts,counts)
+  return numpy.repeat(starts,counts) + numpy.arange(counts.sum()) - firsts
+
+
+########################################################################
+class Tyc2Snapshot(object):
+  """
+In-memory Tycho-2 query engine over snapshot directory from export
+
+Constructor:  Tyc2Snapshot([snapshot])
+
+  snapshot:  path to snapshot directory; default is tyc2.snapshot
+
+Results are tyc2.starDtype arrays, as from tyc2.Tyc2Catalog, with xyz
+converted to float64.
+
+Regions are kept sorted by lodec:  no region is taller than the tallest,
+so those that may meet a box are one slice, found by binary search,
+and only that slice is compared with the box.
+
+Methods:  box; iterbox; cone; polygon; nearest; close.
+
+"""
+
+  def __init__(self, snapshot='tyc2.snapshot'):
+
+    assert os.path.isdir(snapshot), '%s not found' % (snapshot,)
+    self.snapshot = snapshot
+    ### Plain ndarray views of the memory maps:  indexing a numpy.memmap
+    ### costs more per call, and its results are memmaps too
+    load = lambda name: numpy.asarray(numpy.load(os.path.join(snapshot,'%s.npy' % (name,)),mmap_mode='r'))
+
+    ### Region bounds are small, and read by every query:  in memory,
+    ### sorted by lodec
+    regions = numpy.array(load('regions'))
+    regions = regions[numpy.argsort(regions[:,LODEC],kind='mergesort')]
+    self.bounds = [numpy.ascontiguousarray(regions[:,i]) for i in (LORA,HIRA,LODEC,HIDEC,)]
+    self.lodecs = regions[:,LODEC].tolist()
+    self.maxHeight = (regions[:,HIDEC] - regions[:,LODEC]).max()
+    self.ranges = dict([(source,(regions[:,lo].astype(numpy.int64),regions[:,hi].astype(numpy.int64),),)
+                        for source,(lo,hi) in rangeColumns.items()
+                       ])
+    self.xyz,self.mag,self.pm = [dict([(source,load('%s_%s' % (source,name,)),) for source in sources])
+                                 for name in ('xyz','mag','pm',)
+                                ]
+    self.pmMax = dict(zip(sources,load('pmmax').tolist()))
+    self.nStars = sum([len(self.mag[source]) for source in sources])
+
+  def close(self):
+    """Release memory maps"""
+    self.xyz = self.mag = self.pm = None
+
+  def __enter__(self): return self
+  def __exit__(self, *args): self.close()
+
+  def pmMargin(self, source, epoch):
+    """Degrees that any star of source may move between tyc2.tyc2Epoch
+and epoch
+
+"""
+    return self.pmMax[source] * abs(epoch - tyc2.tyc2Epoch) / tyc2.masPerDeg
+
+  def regionsOf(self, boxes):
+    """Sorted positions of index.dat regions that meet any of boxes;
+strict comparisons, as in the R-Tree queries
+
+"""
+    lora,hira,lodec,hidec = self.bounds
+    positions = list()
+    for blora,bhira,blodec,bhidec in boxes:
+      lo = bisect.bisect_right(self.lodecs,blodec-self.maxHeight)
+      hi = bisect.bisect_left(self.lodecs,bhidec)
+      meets = (hira[lo:hi] > blora) & (lora[lo:hi] < bhira) & (hidec[lo:hi] > blodec)
+      positions.append(lo + numpy.flatnonzero(meets))
+    if len(positions) == 1: return positions[0]
+    return numpy.unique(numpy.concatenate(positions or [noIndices]))
+
+  def query(self, sourceBoxes, himag, epoch=None, keep=None):
+    """Return starDtype array of stars of the regions that meet boxes,
+for each (source,boxes) of sourceBoxes, with mag<himag, and, if keep is
+not None, where keep(xyz) is True; with epoch, xyz are propagated
+before keep; stars from each source are in ascending magnitude order
+
+"""
+    parts = list()
+    regions = dict()
+    for source,boxes in sourceBoxes:
+      starts,ends = self.ranges[source]
+      ### Sources queried with the same boxes share one regionsOf
+      if id(boxes) not in regions: regions[id(boxes)] = self.regionsOf(boxes)
+      positions = regions[id(boxes)]
+      indices = gatherRanges(starts[positions],ends[positions])
+      mags = self.mag[source][indices]
+      bright = mags < himag
+      indices,mags = indices[bright],mags[bright]
+      xyz = self.xyz[source][indices].astype(numpy.float64)
+      if epoch is not None and len(indices):
+        pm = self.pm[source][indices].astype(numpy.float64)
+        xyz = tyc2.propagate(xyz,pm[:,0],pm[:,1],epoch-tyc2.tyc2Epoch)
+      if keep is not None:
+        inside = keep(xyz)
+        indices,mags,xyz = indices[inside],mags[inside],xyz[inside]
+      order = numpy.argsort(mags,kind='mergesort')
+      parts.append((source,indices[order],mags[order],xyz[order],))
+
+    ### One result array, filled by slices
+    stars = numpy.empty(sum([len(part[1]) for part in parts]),dtype=tyc2.starDtype)
+    lo = 0
+    for source,indices,mags,xyz in parts:
+      hi = lo + len(indices)
+      stars['offset'][lo:hi] = indices
+      stars['xyz'][lo:hi] = xyz
+      stars['mag'][lo:hi] = mags
+      stars['source'][lo:hi] = source
+      lo = hi
+    return stars
+
+  def sourceBoxes(self, boxes, sources, epoch):
+    """List of (source,boxes) for query; with epoch, each of boxes is
+grown by the pmMargin of each source, as in tyc2.Tyc2Catalog.polygon
+
+"""
+    if epoch is None: return [(source,boxes,) for source in sources]
+    return [(source,[grown for box in boxes for grown in skybox.growBox(*box+(self.pmMargin(source,epoch),))],)
+            for source in sources
+           ]
+
+  def box(self, himag, lora, hira, lodec, hidec, sources=sources, epoch=None, exact=False):
+    """Return starDtype array of stars matching magnitude and RA,DEC
+limits; stars from each source are in ascending magnitude order; see
+tyc2.Tyc2Catalog.box for epoch and exact
+
+"""
+    if epoch is None:
+      boxes = skybox.radecBoxes(lora,hira,lodec,hidec)
+      sourceBoxes = [(source,boxes,) for source in sources]
+    else:
+      sourceBoxes = [(source,skybox.growBox(lora,hira,lodec,hidec,self.pmMargin(source,epoch)),) for source in sources]
+    keep = exact and (lambda xyz: tyc2.inBox(xyz,lora,hira,lodec,hidec)) or None
+    return self.query(sourceBoxes,himag,epoch,keep)
+
+  def iterbox(self, himag, lora, hira, lodec, hidec, sources=sources, chunkSize=65536, epoch=None, exact=False):
+    """Yield starDtype arrays of at most chunkSize stars, from each of
+sources in turn, in ascending magnitude order; see box
+
+"""
+    for source in sources:
+      stars = self.box(himag,lora,hira,lodec,hidec,(source,),epoch,exact)
+      for lo in range(0,len(stars),chunkSize): yield stars[lo:lo+chunkSize]
+
+  def cone(self, xyz, radius, himag, sources=sources, epoch=None):
+    """Return starDtype array of stars within radius degrees of unit
+vector xyz, with magnitude less than himag; stars from each source are
+in ascending magnitude order; see tyc2.Tyc2Catalog.cone
+
+"""
+    norm = math.sqrt(sum([v*v for v in xyz]))
+    axis = tuple([v/norm for v in xyz])
+    cosRadius = math.cos(skybox.rpd*radius)
+    keep = lambda xyz: xyz.dot(axis) >= cosRadius
+    if epoch is None:
+      boxes = skybox.coneBoxes(axis,radius)
+      sourceBoxes = [(source,boxes,) for source in sources]
+    else:
+      sourceBoxes = [(source,skybox.coneBoxes(axis,radius+self.pmMargin(source,epoch)),) for source in sources]
+    return self.query(sourceBoxes,himag,epoch,keep)
+
+  def polygon(self, corners, himag, sources=sources, epoch=None):
+    """Return starDtype array of stars inside the convex spherical
+polygon with vertices corners, with magnitude less than himag; see
+tyc2.Tyc2Catalog.polygon
+
+"""
+    normals = numpy.array(skybox.polygonNormals(corners)).T
+    keep = lambda xyz: (xyz.dot(normals) >= 0.0).all(axis=1)
+    return self.query(self.sourceBoxes(skybox.polygonBoxes(corners),sources,epoch),himag,epoch,keep)
+
+  def nearest(self, xyz, n, himag, sources=sources):
+    """Return starDtype array of the n stars, of all of sources, with
+magnitude less than himag, nearest to vector xyz, nearest first
+
+Searches cones of doubling radius, starting from the radius that would
+hold about 2n stars at the mean density of the snapshot, until one
+holds n stars; every star nearer than the n-th is inside that cone.
+
+"""
+    norm = math.sqrt(sum([v*v for v in xyz]))
+    axis = tuple([v/norm for v in xyz])
+    radius = math.sqrt(2.0 * n * skyDegrees / (math.pi * max(self.nStars,1)))
+    while True:
+      stars = self.cone(axis,radius,himag,sources)
+      if len(stars) >= n or radius >= 180.0: break
+      radius = min(2.0 * radius,180.0)
+    order = numpy.argsort(-stars['xyz'].dot(axis),kind='mergesort')
+    return stars[order[:n]]
+
+
+########################################################################
+if __name__ == "__main__":
+
+  dikt = dict(export=False
+             ,sqlite3db='tyc2.sqlite3'
+             ,snapshot='tyc2.snapshot'
+             )
+
+  for arg in sys.argv[1:]:
+
+    for key in dikt:
+
+      if arg == key and dikt[key] is False:
+        dikt[key] = True
+        break
+
+      dashkey = '--%s=' % key
+      L = len(dashkey)
+      if dashkey == arg[:L]:
+        dikt[key] = arg[L:]
+        break
+
+  if dikt['export']: export(dikt['sqlite3db'],dikt['snapshot'])